@@ -0,0 +1,267 @@
+import argparse
+import concurrent.futures
+import os
+import time
+from collections import Counter
+from rle import (RLE_Encode, RLE_EncodeBulk, RLE_Decode, RLE_DecodeSpans, RLE2_Encode, RLE2_Decode,
+                 RLEParallelBlocks, RLEParallelDecode)
+from tans import TANS, TANSCodec, TANS_TABLE_CACHE, GetTANSCodec
+from lzw import (LZW_Compress, LZW_CompressTrie, LZW_CHUNK_SIZE, ChunkCompressorPacked, ChunkDecompressorPacked,
+                 LZWParallelPacked, ParallelDecompLZWTable)
+from pool import GetPool
+from bitio import BitWriter, BitReader
+
+SAMPLES_DIR = os.path.join('samples', 'Binary files')
+
+
+def SampleFiles(InputDir: str = SAMPLES_DIR) -> list[str]:
+    return sorted(os.path.join(InputDir, f) for f in os.listdir(InputDir)
+                  if os.path.isfile(os.path.join(InputDir, f)))
+
+
+def BestTime(fn, *args, repeat: int = 3):
+    Best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        Elapsed = time.perf_counter() - start
+        if Best is None or Elapsed < Best:
+            Best = Elapsed
+    return Best, result
+
+
+def ReportLine(name: str, size: int, BaseTime: float, NewTime: float):
+    print(f"{name:28s} {size:>10d} B  old {BaseTime:7.3f}s  new {NewTime:7.3f}s  "
+          f"({size / NewTime / 1e6:6.2f} MB/s, x{BaseTime / NewTime:.2f})")
+
+
+def BenchLZWEncoders(Files: list[str], repeat: int):
+    print("LZW encoder: bytes-keyed dictionary vs trie")
+    for path in Files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        BaseTime, BaseCodes = BestTime(LZW_Compress, data, repeat=repeat)
+        NewTime, NewCodes = BestTime(LZW_CompressTrie, data, repeat=repeat)
+        if BaseCodes != NewCodes:
+            raise AssertionError(f"Trie encoder output differs for {path}")
+        ReportLine(os.path.basename(path), len(data), BaseTime, NewTime)
+
+
+def BenchRLEEncoders(Files: list[str], repeat: int):
+    print("RLE encoder: byte loop vs bulk run detection")
+    for path in Files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        BaseTime, BaseOut = BestTime(RLE_Encode, data, repeat=repeat)
+        NewTime, NewOut = BestTime(RLE_EncodeBulk, data, repeat=repeat)
+        if BaseOut != NewOut:
+            raise AssertionError(f"Bulk RLE encoder output differs for {path}")
+        ReportLine(os.path.basename(path), len(data), BaseTime, NewTime)
+
+
+def BenchRLEDecoders(Files: list[str], repeat: int):
+    print("RLE decoder: byte loop vs split-and-join span copying")
+    for path in Files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        Encoded = RLE_EncodeBulk(data)
+        BaseTime, BaseOut = BestTime(RLE_Decode, Encoded, repeat=repeat)
+        NewTime, NewOut = BestTime(RLE_DecodeSpans, Encoded, repeat=repeat)
+        if BaseOut != NewOut:
+            raise AssertionError(f"Span RLE decoder output differs for {path}")
+        ReportLine(os.path.basename(path), len(data), BaseTime, NewTime)
+
+
+def BenchRLEFormats(Files: list[str], repeat: int):
+    print("RLE format: escaped v1 vs varint v2 (decode time, encoded sizes)")
+    for path in Files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        Encoded = RLE_EncodeBulk(data)
+        Encoded2 = RLE2_Encode(data)
+        BaseTime, BaseOut = BestTime(RLE_DecodeSpans, Encoded, repeat=repeat)
+        NewTime, NewOut = BestTime(RLE2_Decode, Encoded2, repeat=repeat)
+        if BaseOut != NewOut:
+            raise AssertionError(f"RLE2 decoder output differs for {path}")
+        ReportLine(os.path.basename(path), len(data), BaseTime, NewTime)
+        print(f"{'':28s} size v1 {len(Encoded):>10d} B  v2 {len(Encoded2):>10d} B")
+
+
+def BenchRLEParallel(Files: list[str], repeat: int):
+    print("RLE blocks: single process vs parallel blocks on the persistent pool")
+    data = b"".join(open(path, 'rb').read() for path in Files)
+    GetPool().Start()
+
+    BaseTime, BaseOut = BestTime(RLE_EncodeBulk, data, repeat=repeat)
+    NewTime, (Blocks, RawLengths) = BestTime(RLEParallelBlocks, data, repeat=repeat)
+    if BaseOut != b"".join(Blocks):
+        raise AssertionError("Parallel RLE blocks differ from the single-process stream")
+    ReportLine(f"encode {len(Files)} files", len(data), BaseTime, NewTime)
+
+    Table = list(zip(map(len, Blocks), RawLengths))
+    BaseTime, BaseOut = BestTime(RLE_DecodeSpans, BaseOut, repeat=repeat)
+    NewTime, NewOut = BestTime(RLEParallelDecode, b"".join(Blocks), Table, repeat=repeat)
+    if BaseOut != NewOut or NewOut != data:
+        raise AssertionError("Parallel RLE decode output differs")
+    ReportLine(f"decode {len(Files)} files", len(data), BaseTime, NewTime)
+
+
+def InputSizedTANS(FreqTable: dict, TotalFreq: int) -> TANS:
+    return TANS(FreqTable, TableSize=1 << (TotalFreq - 1).bit_length())
+
+
+def BenchTANSTables(Files: list[str], repeat: int):
+    print("tANS table build: input-sized table vs bounded table log")
+    for path in Files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        FreqTable = dict(Counter(data))
+        BaseTime, _ = BestTime(InputSizedTANS, FreqTable, len(data), repeat=repeat)
+        NewTime, Codec = BestTime(TANSCodec, FreqTable, repeat=repeat)
+        if set(Codec.Counts) != set(FreqTable) or min(Codec.Counts.values()) < 1:
+            raise AssertionError(f"Normalized table drops symbols for {path}")
+        ReportLine(os.path.basename(path), len(data), BaseTime, NewTime)
+
+
+def BenchTANSCache(Files: list[str], repeat: int, copies: int = 20):
+    print(f"tANS table cache: fresh table per file vs LRU cache ({copies} files per distribution)")
+    for path in Files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        Codec = TANSCodec(dict(Counter(data)))
+        State, Pad, Payload = Codec.Encode(data)
+        Batch = [(Codec.Counts, Codec.TableLog)] * copies
+
+        def Fresh():
+            return [TANSCodec(Counts, TableLog, normalized=True).Decode(State, Pad, Payload, len(data))
+                    for Counts, TableLog in Batch]
+
+        def Cached():
+            TANS_TABLE_CACHE.Clear()
+            return [GetTANSCodec(Counts, TableLog, normalized=True).Decode(State, Pad, Payload, len(data))
+                    for Counts, TableLog in Batch]
+
+        BaseTime, BaseOut = BestTime(Fresh, repeat=repeat)
+        NewTime, NewOut = BestTime(Cached, repeat=repeat)
+        if BaseOut != NewOut or NewOut[0] != data:
+            raise AssertionError(f"Cached tANS decode output differs for {path}")
+        ReportLine(os.path.basename(path), len(data) * copies, BaseTime, NewTime)
+        Stats = TANS_TABLE_CACHE.Stats()
+        print(f"{'':28s} cache hits {Stats['hits']}  misses {Stats['misses']}")
+
+
+def WriteFields(values: list[int], width: int) -> bytes:
+    Writer = BitWriter()
+    for value in values:
+        Writer.Write(value, width)
+    return Writer.Flush()
+
+
+def WriteFieldsBulk(values: list[int], width: int) -> bytes:
+    Writer = BitWriter()
+    Writer.WriteMany(values, width)
+    return Writer.Flush()
+
+
+def ReadFields(data: bytes, count: int, width: int) -> list[int]:
+    Reader = BitReader(data)
+    return [Reader.Read(width) for _ in range(count)]
+
+
+def ReadFieldsBulk(data: bytes, count: int, width: int) -> list[int]:
+    return BitReader(data).ReadMany(count, width)
+
+
+def BenchBitIO(Files: list[str], repeat: int):
+    print("Bit I/O: field-at-a-time vs bulk fixed-width packing of LZW codes")
+    codes = LZW_CompressTrie(b"".join(open(path, 'rb').read() for path in Files))
+    for width in (4, 12, 16):
+        values = [code & ((1 << width) - 1) for code in codes]
+        BaseTime, BaseOut = BestTime(WriteFields, values, width, repeat=repeat)
+        NewTime, NewOut = BestTime(WriteFieldsBulk, values, width, repeat=repeat)
+        if BaseOut != NewOut:
+            raise AssertionError(f"Bulk bit writer output differs at {width} bits")
+        ReportLine(f"write {width}-bit fields", len(NewOut), BaseTime, NewTime)
+
+        BaseTime, BaseOut = BestTime(ReadFields, NewOut, len(values), width, repeat=repeat)
+        NewTime, NewOut = BestTime(ReadFieldsBulk, NewOut, len(values), width, repeat=repeat)
+        if BaseOut != NewOut or NewOut != values:
+            raise AssertionError(f"Bulk bit reader output differs at {width} bits")
+        ReportLine(f"read {width}-bit fields", len(values) * width // 8, BaseTime, NewTime)
+
+
+def FreshPoolCompress(Datas: list[bytes]) -> list[list[bytes]]:
+    results = []
+    for data in Datas:
+        chunks = [data[i:i + LZW_CHUNK_SIZE] for i in range(0, len(data), LZW_CHUNK_SIZE)]
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            results.append(list(executor.map(ChunkCompressorPacked, chunks)))
+    return results
+
+
+def FreshPoolDecompress(Packed: list[list[bytes]]) -> list[bytes]:
+    results = []
+    for chunks in Packed:
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            results.append(b"".join(executor.map(ChunkDecompressorPacked, chunks)))
+    return results
+
+
+def BenchLZWPool(Files: list[str], repeat: int):
+    print("Parallel LZW: fresh ProcessPoolExecutor per file vs persistent shared-memory pool")
+    Datas = []
+    for path in Files:
+        with open(path, 'rb') as f:
+            Datas.append(f.read())
+    TotalSize = sum(len(d) for d in Datas)
+    GetPool().Start()
+
+    BaseTime, BasePacked = BestTime(FreshPoolCompress, Datas, repeat=repeat)
+    NewTime, NewPacked = BestTime(lambda ds: [LZWParallelPacked(d) for d in ds], Datas, repeat=repeat)
+    if BasePacked != NewPacked:
+        raise AssertionError("Pooled LZW compression output differs")
+    ReportLine(f"compress {len(Datas)} files", TotalSize, BaseTime, NewTime)
+
+    BaseTime, BaseOut = BestTime(FreshPoolDecompress, NewPacked, repeat=repeat)
+    Tables = [[(len(chunk), min(LZW_CHUNK_SIZE, len(d) - i * LZW_CHUNK_SIZE)) for i, chunk in enumerate(p)]
+              for d, p in zip(Datas, NewPacked)]
+    NewTime, NewOut = BestTime(lambda ps: [ParallelDecompLZWTable(b"".join(p), t) for p, t in zip(ps, Tables)],
+                               NewPacked, repeat=repeat)
+    if BaseOut != NewOut or NewOut != Datas:
+        raise AssertionError("Pooled LZW decompression output differs")
+    ReportLine(f"decompress {len(Datas)} files", TotalSize, BaseTime, NewTime)
+
+
+BENCHMARKS = {
+    'lzw-encoder': BenchLZWEncoders,
+    'lzw-pool': BenchLZWPool,
+    'rle-encoder': BenchRLEEncoders,
+    'rle-decoder': BenchRLEDecoders,
+    'rle-format': BenchRLEFormats,
+    'rle-parallel': BenchRLEParallel,
+    'tans-table': BenchTANSTables,
+    'tans-cache': BenchTANSCache,
+    'bit-io': BenchBitIO,
+}
+
+
+def main():
+    Getter = argparse.ArgumentParser(description="Codec throughput benchmarks")
+    Getter.add_argument("names", nargs="*", help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    Getter.add_argument("--input-dir", default=SAMPLES_DIR, help="Directory of sample files")
+    Getter.add_argument("--repeat", type=int, default=3, help="Timing repetitions (best is reported)")
+    args = Getter.parse_args()
+
+    Unknown = [name for name in args.names if name not in BENCHMARKS]
+    if Unknown:
+        Getter.error(f"unknown benchmark(s): {', '.join(Unknown)}")
+
+    Files = SampleFiles(args.input_dir)
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name](Files, args.repeat)
+        print()
+
+
+if __name__ == "__main__":
+    main()
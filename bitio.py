@@ -0,0 +1,214 @@
+import sys
+from array import array
+from itertools import repeat
+from operator import lshift, rshift, or_, and_
+
+CODE_TYPECODES = {1: 'B', 2: 'H', 4: 'I' if array('I').itemsize == 4 else 'L', 8: 'Q'}
+BIT_ACC_BITS = 64
+BIT_ACC_MASK = (1 << BIT_ACC_BITS) - 1
+BIT_GROUP_LEVELS = 3
+REVERSE_BLOCK_BITS = 256
+REVERSE_BLOCK_MASK = (1 << REVERSE_BLOCK_BITS) - 1
+BIT_GROUP_FIELDS = 1 << BIT_GROUP_LEVELS
+
+
+def CodesToBytes(codes, width: int = 2) -> bytes:
+    Packed = array(CODE_TYPECODES[width], codes)
+    if width > 1 and sys.byteorder == 'little':
+        Packed.byteswap()
+    return Packed.tobytes()
+
+
+def BytesToCodes(data: bytes, width: int = 2) -> array:
+    if len(data) % width != 0:
+        raise ValueError(f"Data length {len(data)} is not a multiple of code size {width}")
+    codes = array(CODE_TYPECODES[width])
+    codes.frombytes(data)
+    if width > 1 and sys.byteorder == 'little':
+        codes.byteswap()
+    return codes
+
+
+def VarintBytes(value: int) -> bytes:
+    Encoded = bytearray()
+    while value >= 0x80:
+        Encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    Encoded.append(value)
+    return bytes(Encoded)
+
+
+def ReadVarint(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    Shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Truncated varint")
+        Byte = data[pos]
+        pos += 1
+        value |= (Byte & 0x7F) << Shift
+        if Byte < 0x80:
+            return value, pos
+        Shift += 7
+
+
+def PackFields(values, width: int) -> bytes:
+    if width % 8 == 0 and width // 8 in CODE_TYPECODES:
+        return CodesToBytes(values, width // 8)
+    Groups = list(values)
+    Count = len(Groups)
+    Groups += [0] * (-Count % BIT_GROUP_FIELDS)
+    Width = width
+    for _ in range(BIT_GROUP_LEVELS):
+        Groups = list(map(or_, map(lshift, Groups[0::2], repeat(Width)), Groups[1::2]))
+        Width *= 2
+    return b"".join(map(int.to_bytes, Groups, repeat(width), repeat('big')))[:(Count * width + 7) // 8]
+
+
+def UnpackFields(data: bytes, count: int, width: int) -> list[int]:
+    if width % 8 == 0 and width // 8 in CODE_TYPECODES:
+        return BytesToCodes(data[:count * width // 8], width // 8).tolist()
+    GroupCount = -(-count // BIT_GROUP_FIELDS)
+    data = bytes(data[:GroupCount * width]).ljust(GroupCount * width, b"\0")
+    Groups = list(map(int.from_bytes, map(data.__getitem__, map(slice, range(0, len(data), width), range(width, len(data) + width, width))), repeat('big')))
+    Width = width << (BIT_GROUP_LEVELS - 1)
+    for _ in range(BIT_GROUP_LEVELS):
+        Fields = [0] * (2 * len(Groups))
+        Fields[0::2] = map(rshift, Groups, repeat(Width))
+        Fields[1::2] = map(and_, Groups, repeat((1 << Width) - 1))
+        Groups = Fields
+        Width //= 2
+    del Groups[count:]
+    return Groups
+
+
+class BitWriter:
+    def __init__(self):
+        self.Buffer = bytearray()
+        self.Acc = 0
+        self.Count = 0
+
+    def Write(self, value: int, width: int):
+        self.Acc = (self.Acc << width) | value
+        self.Count += width
+        if self.Count >= BIT_ACC_BITS:
+            self.Count -= BIT_ACC_BITS
+            self.Buffer += (self.Acc >> self.Count).to_bytes(BIT_ACC_BITS // 8, 'big')
+            self.Acc &= (1 << self.Count) - 1
+
+    def WriteMany(self, values, width: int):
+        Bits = len(values) * width
+        if not Bits:
+            return
+        Packed = int.from_bytes(PackFields(values, width), 'big') >> (-Bits % 8)
+        Total = self.Count + Bits
+        Combined = (self.Acc << Bits) | Packed
+        self.Count = Total % 8
+        self.Buffer += (Combined >> self.Count).to_bytes(Total // 8, 'big')
+        self.Acc = Combined & ((1 << self.Count) - 1)
+
+    def Take(self) -> bytes:
+        Completed = bytes(self.Buffer)
+        self.Buffer.clear()
+        return Completed
+
+    def Flush(self) -> bytes:
+        if self.Count:
+            Pad = -self.Count % 8
+            self.Buffer += (self.Acc << Pad).to_bytes((self.Count + Pad) // 8, 'big')
+            self.Acc = 0
+            self.Count = 0
+        return bytes(self.Buffer)
+
+
+class BitReader:
+    def __init__(self, data: bytes = b""):
+        self.Data = data
+        self.Pos = 0
+        self.Acc = 0
+        self.Count = 0
+
+    def Feed(self, data: bytes):
+        self.Data = self.Data[self.Pos:] + data
+        self.Pos = 0
+
+    def Remaining(self) -> int:
+        return self.Count + 8 * (len(self.Data) - self.Pos)
+
+    def Tell(self) -> int:
+        return 8 * self.Pos - self.Count
+
+    def Seek(self, bit_pos: int):
+        self.Pos, Offset = divmod(bit_pos, 8)
+        self.Acc = 0
+        self.Count = 0
+        if Offset:
+            self.Count = 8 - Offset
+            self.Acc = self.Data[self.Pos] & ((1 << self.Count) - 1)
+            self.Pos += 1
+
+    def Read(self, width: int) -> int:
+        while self.Count < width:
+            if self.Pos + BIT_ACC_BITS // 8 <= len(self.Data):
+                self.Acc = (self.Acc << BIT_ACC_BITS) | int.from_bytes(self.Data[self.Pos:self.Pos + BIT_ACC_BITS // 8], 'big')
+                self.Pos += BIT_ACC_BITS // 8
+                self.Count += BIT_ACC_BITS
+            elif self.Pos < len(self.Data):
+                self.Acc = (self.Acc << 8) | self.Data[self.Pos]
+                self.Pos += 1
+                self.Count += 8
+            else:
+                raise EOFError(f"Bit stream exhausted reading {width} bits")
+        self.Count -= width
+        value = self.Acc >> self.Count
+        self.Acc &= (1 << self.Count) - 1
+        return value
+
+    def ReadMany(self, count: int, width: int) -> list[int]:
+        Bits = count * width
+        if Bits > self.Remaining():
+            raise EOFError(f"Bit stream exhausted reading {count} fields of {width} bits")
+        Needed = max(0, -(-(Bits - self.Count) // 8))
+        Window = int.from_bytes(self.Data[self.Pos:self.Pos + Needed], 'big')
+        Combined = (self.Acc << 8 * Needed) | Window
+        self.Pos += Needed
+        self.Count += 8 * Needed - Bits
+        Fields = Combined >> self.Count
+        self.Acc = Combined & ((1 << self.Count) - 1)
+        Pad = -Bits % 8
+        return UnpackFields((Fields << Pad).to_bytes((Bits + Pad) // 8, 'big'), count, width)
+
+
+class ReverseBitWriter:
+    def __init__(self):
+        self.Blocks = []
+
+    def Spill(self, Acc: int, Count: int) -> tuple[int, int]:
+        self.Blocks.append((Acc & REVERSE_BLOCK_MASK).to_bytes(REVERSE_BLOCK_BITS // 8, 'big'))
+        return Acc >> REVERSE_BLOCK_BITS, Count - REVERSE_BLOCK_BITS
+
+    def Flush(self, Acc: int, Count: int) -> tuple[int, bytes]:
+        Tail = Count // BIT_ACC_BITS * BIT_ACC_BITS + BIT_ACC_BITS
+        self.Blocks.append(Acc.to_bytes(Tail // 8, 'big'))
+        self.Blocks.reverse()
+        return Tail - Count, b"".join(self.Blocks)
+
+
+class ReverseBitReader:
+    def __init__(self, data: bytes, pad: int):
+        if len(data) % (BIT_ACC_BITS // 8) != 0:
+            raise ValueError(f"Reverse bit stream length {len(data)} is not a multiple of 8")
+        self.Data = data
+        self.Pos = BIT_ACC_BITS // 8
+        self.Acc = int.from_bytes(data[:BIT_ACC_BITS // 8], 'big')
+        self.Count = BIT_ACC_BITS - pad
+
+    def Refill(self, Acc: int, Count: int) -> tuple[int, int]:
+        Block = self.Data[self.Pos:self.Pos + REVERSE_BLOCK_BITS // 8]
+        if not Block:
+            raise EOFError(f"Bit stream exhausted with {Count} bits left")
+        self.Pos += len(Block)
+        return ((Acc & ((1 << Count) - 1)) << 8 * len(Block)) | int.from_bytes(Block, 'big'), Count + 8 * len(Block)
+
+    def AtEnd(self, Count: int) -> bool:
+        return self.Pos == len(self.Data) and Count == 0
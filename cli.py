@@ -1,7 +1,10 @@
 import argparse
 import os
 import concurrent.futures
-from compress import FileCompressor
+from compress import FileCompressor, CONTAINER_BLOCK_SIZE, PRESET_METHODS
+from lzw import DEFAULT_MAX_CODE_BITS, LZW_CHUNK_SIZE, LZW_BYTES_PER_ENTRY, LZWChunkSize, TrainLZWPreset, SaveLZWPreset, ValPresetId
+from tans import (TANS_DEFAULT_TABLE_LOG, TANS_MIN_TABLE_LOG, TANS_MAX_TABLE_LOG,
+                  TANS_TABLE_CACHE_SIZE, TANS_TABLE_CACHE, SetTANSCacheSize)
 from decompress import FileDecompressor
 from plot import GenCompReport, GenDeCompReport
 
@@ -17,8 +20,19 @@ def SuffixRemover(FileName: str, SuffixesList: list[str]) -> str:
             return BASE[:-len(PatternLogic)] + Extension
     return FileName
 
+def CacheDelta(Before: dict) -> tuple[int, int]:
+    After = TANS_TABLE_CACHE.Stats()
+    return After['hits'] - Before['hits'], After['misses'] - Before['misses']
+
+def CacheSummary(Deltas):
+    Hits = sum(d[0] for d in Deltas)
+    Misses = sum(d[1] for d in Deltas)
+    if Hits or Misses:
+        print(f" tANS table cache: {Hits} hits, {Misses} misses")
+
 def CompressionProcessor(args):
-    File, InputDir, OutputDir, method, SUFFIX = args
+    File, InputDir, OutputDir, method, SUFFIX, CodecOptions = args
+    Before = TANS_TABLE_CACHE.Stats()
     InputPath = os.path.join(InputDir, File)
     OutputPath = os.path.join(OutputDir, File)
 
@@ -27,29 +41,33 @@ def CompressionProcessor(args):
             print(f" Skipping empty File: {File}")
             return None
 
-        FileCompressor(InputPath, OutputPath, method)
+        FileCompressor(InputPath, OutputPath, method, **CodecOptions)
         CompSize = os.path.getsize(OutputPath)
 
         NewName = SuffixAdder(File, SUFFIX)
         NewPath = os.path.join(OutputDir, NewName)
         os.rename(OutputPath, NewPath)
 
-        return (NewName, os.path.getsize(InputPath), CompSize)
+        return (NewName, os.path.getsize(InputPath), CompSize, CacheDelta(Before))
 
     except Exception as e:
         print(f"X Compression failed for {File}: {e}")
         return None
 
 def DecompressionProcessor(args):
-    File, InputDir, OutputDir, SuffixesList = args
+    Before = TANS_TABLE_CACHE.Stats()
+    return DecompressFile(args) + (CacheDelta(Before),)
+
+def DecompressFile(args):
+    File, InputDir, OutputDir, SuffixesList, SkipCorrupt = args
     InputPath = os.path.join(InputDir, File)
     OutputPath = os.path.join(OutputDir, File)
 
     try:
-        result = FileDecompressor(InputPath, OutputPath)
-        if result is None:
-            err_msg = "TANS compression failed! File not suitable for TANS compression!"
-            print(f"!!! Skipping writing output: File {File} is not suitable for TANS decompression.")
+        if not FileDecompressor(InputPath, OutputPath, skip_corrupt=SkipCorrupt):
+            err_msg = "Decompression failed, see the log above."
+            if SkipCorrupt and os.path.exists(OutputPath):
+                err_msg = "Corrupt blocks were zero-filled in the output."
             return (File, os.path.getsize(InputPath), 0, False, err_msg)
 
         if not os.path.exists(OutputPath):
@@ -78,28 +96,82 @@ def main():
         choices=[
             'lzw',
             'rle',
+            'rle2',
             'rle+lzw',
             'tans',
+            'tans2',
+            'tans-blocks',
+            'tans-o1',
             'rle+tans',
             'lzw+tans',
-            'rle+lzw+tans'
+            'rle+lzw+tans',
+            'lzw-stream'
         ],
         default='lzw',
         help="Compression/decompression method"
     )
+    Getter.add_argument("--max-bits", type=int, default=DEFAULT_MAX_CODE_BITS,
+                        help="Maximum LZW code width in bits (9-20); above 16 the LZW chunk size grows to fit the dictionary")
+    Getter.add_argument("--no-lzw-reset", action="store_true",
+                        help="Disable adaptive LZW dictionary reset (CLEAR codes)")
+    Getter.add_argument("--chunk-size", type=int, default=LZW_CHUNK_SIZE,
+                        help=f"Input bytes per independently compressed LZW chunk; raised to {LZW_BYTES_PER_ENTRY} "
+                             "bytes per dictionary entry with --fill-chunks or --max-bits above 16")
+    Getter.add_argument("--fill-chunks", action="store_true",
+                        help="Grow LZW chunks until the dictionary can fill, so adaptive reset can fire "
+                             "(fewer, larger chunks compress better but parallelise less)")
+    Getter.add_argument("--table-log", type=int, default=TANS_DEFAULT_TABLE_LOG,
+                        help=f"tANS table size as a power of two ({TANS_MIN_TABLE_LOG}-{TANS_MAX_TABLE_LOG})")
+    Getter.add_argument("--tans-cache-size", type=int, default=TANS_TABLE_CACHE_SIZE,
+                        help="Built tANS tables kept per worker process (0 disables the cache)")
+    Getter.add_argument("--block-size", type=int, default=CONTAINER_BLOCK_SIZE,
+                        help="Input bytes read, compressed and written per container block (bounds peak memory)")
+    Getter.add_argument("--skip-corrupt", action="store_true",
+                        help="Zero-fill container blocks that fail their checksum instead of aborting")
+    Getter.add_argument("--preset", default=None,
+                        help="ID of a trained LZW preset dictionary to prime compression with")
+    Getter.add_argument("--train-preset", metavar="CORPUS_DIR", default=None,
+                        help="Train an LZW preset dictionary from CORPUS_DIR and save it under --preset")
     args = Getter.parse_args()
 
     SuffixesList = {
         'lzw': 'lzw_compressed',
         'rle': 'rle_compressed',
+        'rle2': 'rle2_compressed',
         'rle+lzw': 'rle_lzw_compressed',
         'tans': 'tans_compressed',
+        'tans2': 'tans2_compressed',
+        'tans-blocks': 'tans_blocks_compressed',
+        'tans-o1': 'tans_o1_compressed',
         'rle+tans': 'rle_tans_compressed',
         'lzw+tans': 'lzw_tans_compressed',
-        'rle+lzw+tans': 'rle_lzw_tans_compressed'
+        'rle+lzw+tans': 'rle_lzw_tans_compressed',
+        'lzw-stream': 'lzw_stream_compressed'
     }
     SUFFIX = SuffixesList.get(args.method, 'compressed')
 
+    if args.chunk_size <= 0:
+        Getter.error(f"--chunk-size must be positive, got {args.chunk_size}")
+    ChunkSize = LZWChunkSize(args.chunk_size, args.max_bits, args.fill_chunks)
+    if args.compress and args.method == 'lzw' and ChunkSize != args.chunk_size:
+        print(f" LZW chunk size raised from {args.chunk_size} to {ChunkSize} bytes to fit a {args.max_bits}-bit dictionary")
+
+    if args.preset is not None:
+        try:
+            ValPresetId(args.preset)
+        except ValueError as e:
+            Getter.error(str(e))
+        if args.compress and args.method not in PRESET_METHODS:
+            Getter.error(f"--preset is only supported with --method {', '.join(sorted(PRESET_METHODS))}, not {args.method}")
+
+    if args.train_preset:
+        if not args.preset:
+            Getter.error("--train-preset requires --preset ID")
+        preset = TrainLZWPreset(args.train_preset, args.preset)
+        print(f" Trained LZW preset '{args.preset}' with {len(preset)} entries: {SaveLZWPreset(preset)}")
+        if not (args.compress or args.decompress):
+            return
+
     ReportsDir = 'reports'
     os.makedirs(ReportsDir, exist_ok=True) 
 
@@ -109,14 +181,19 @@ def main():
         os.makedirs(OutputDir, exist_ok=True)
 
         Files = [f for f in os.listdir(InputDir) if os.path.isfile(os.path.join(InputDir, f))]
-        Tasks = [(f, InputDir, OutputDir, args.method, SUFFIX) for f in Files]
+        CodecOptions = {'max_bits': args.max_bits, 'lzw_reset': not args.no_lzw_reset,
+                        'lzw_chunk_size': ChunkSize, 'lzw_preset': args.preset,
+                        'tans_table_log': args.table_log, 'block_size': args.block_size}
+        Tasks = [(f, InputDir, OutputDir, args.method, SUFFIX, CodecOptions) for f in Files]
 
-        with concurrent.futures.ProcessPoolExecutor() as executor:
+        with concurrent.futures.ProcessPoolExecutor(initializer=SetTANSCacheSize,
+                                                    initargs=(args.tans_cache_size,)) as executor:
             results = list(executor.map(CompressionProcessor, Tasks))
 
         ValidResults = [r for r in results if r]
         if ValidResults:
-            files_, OriginalSizes, CompSizes = zip(*ValidResults)
+            files_, OriginalSizes, CompSizes, CacheDeltas = zip(*ValidResults)
+            CacheSummary(CacheDeltas)
             GenCompReport(ReportsDir, args.method, files_, OriginalSizes, CompSizes)
             print(f" Compression report saved to: {ReportsDir}")
         else:
@@ -129,20 +206,22 @@ def main():
 
         Files = [f for f in os.listdir(InputDir) if os.path.isfile(os.path.join(InputDir, f))]
         SuffixesList = list(SuffixesList.values())
-        Tasks = [(f, InputDir, OutputDir, SuffixesList) for f in Files]
+        Tasks = [(f, InputDir, OutputDir, SuffixesList, args.skip_corrupt) for f in Files]
 
-        with concurrent.futures.ProcessPoolExecutor() as executor:
+        with concurrent.futures.ProcessPoolExecutor(initializer=SetTANSCacheSize,
+                                                    initargs=(args.tans_cache_size,)) as executor:
             results = list(executor.map(DecompressionProcessor, Tasks))
 
-        for File, orig_size, dec_size, success, err in results:
+        for File, orig_size, dec_size, success, err, _ in results:
             if success:
                 print(f"Decompressed: {File} (Original: {orig_size} bytes, Decompressed: {dec_size} bytes)")
             else:
                 print(f"X Failed to decompress: {File} ({err})")
 
+        CacheSummary([r[5] for r in results])
         Success_Res = [r for r in results if r[3]]
         if Success_Res:
-            files_, OriginalSizes, dec_sizes, _, _ = zip(*Success_Res)
+            files_, OriginalSizes, dec_sizes, _, _, _ = zip(*Success_Res)
             GenDeCompReport(ReportsDir, args.method, files_, OriginalSizes, dec_sizes)
             print(f" Decompression report saved to: {ReportsDir}")
         else:
@@ -1,25 +1,43 @@
 import os
+import zlib
 import traceback
+from io import BytesIO
 import concurrent.futures
 from typing import List, Tuple
 from collections import Counter
-from lzw import LZWParallel, LZW_Compress
-from rle import RLE_Encode
-from tans import TANS
+from lzw import (LZWParallelPacked, LZW_CompressTrie, LZWEncoder, LoadLZWPreset, DEFAULT_MAX_CODE_BITS,
+                 LZW_CHUNK_SIZE, LZW_RESET_FLAG, LZW_PRESET_FLAG, LZWChunkSize, ValPresetId)
+from pool import GetPool
+from rle import RLEParallelBlocks, RLE_EncodeParallel, RLE2_Encode
+from bitio import CodesToBytes, VarintBytes
+from tans import (GetTANSCodec, TANS_DEFAULT_TABLE_LOG, TANS_BLOCK_SIZE, TANS_COMPACT_FLAG, ValTableLog,
+                  TANS_CONTEXT_MIN_GAIN, NormalizeFrequencies, CodedBits, EncodeLane, ContextFrequencies, EncodeContexts,
+                  CodeBuckets, EntropySample, SampledCodedBits, CODING_STORED, CODING_RLE, CODING_TANS)
 
 MAGIC_HEADERS = {
-    'lzw': b'LZ__',
-    'rle': b'rle_',
-    'tans': b'TANS',
+    'lzw': b'LZCT',
+    'rle': b'RLBK',
+    'rle2': b'RLE2',
+    'tans': b'TANA',
+    'tans2': b'TAN2',
+    'tans-blocks': b'TANB',
+    'tans-o1': b'TAO1',
     'rle+lzw': b'MLZW',
-    'rle+tans': b'RTNS',
-    'lzw+tans': b'LTNS',
-    'rle+lzw+tans': b'RLTN',
+    'rle+tans': b'RTN2',
+    'lzw+tans': b'LTN2',
+    'rle+lzw+tans': b'RLT2',
+    'lzw-stream': b'LZST',
 }
- 
-def PowerTwo(n: int) -> int:
-    return 1 << (n - 1).bit_length()
 
+PRESET_METHODS = {'lzw'}
+
+STREAM_BLOCK_SIZE = 1 << 20
+CONTAINER_MAGIC = b'CTR2'
+CONTAINER_VERSION = 2
+CONTAINER_BLOCK_SIZE = 1 << 22
+CONTAINER_MIN_BLOCK_SIZE = 1 << 12
+CONTAINER_MAX_BLOCK_SIZE = 1 << 30
+ 
 def ChunkedDataWriter(FileOut, data, ChunkSize: int = 1 << 18):
     if isinstance(data, str):
         data = data.Encode('utf-8')
@@ -28,112 +46,282 @@ def ChunkedDataWriter(FileOut, data, ChunkSize: int = 1 << 18):
         FileOut.write(len(chunk).to_bytes(4, 'big'))
         FileOut.write(chunk)
 
-def BitPacker(Bits):
-    PackedBits = bytearray()
-    for i in range(0, len(Bits), 2):
-        FirstBits = Bits[i] & 0xF
-        SecondBits = Bits[i+1] & 0xF if i+1 < len(Bits) else 0
-        PackedBits.append((FirstBits << 4) | SecondBits)
-    return bytes(PackedBits)
-
-class TANSCompressionSkipped(Exception):
-    pass
-
-def TansEncoded_Data_Writer(FileOut, FreqTable, Bits, FinalState, original_length, TableSize=65536):
-    FileOut.write(TableSize.to_bytes(4, 'big'))
-    FileOut.write(len(FreqTable).to_bytes(2, 'big'))
-    for Sym, Freq in FreqTable.items():
-        FileOut.write(bytes([Sym]))
-        FileOut.write(Freq.to_bytes(4, 'big'))
-    if isinstance(FinalState, list):
-        FinalState = FinalState[-1] 
-    FileOut.write(FinalState.to_bytes(4, 'big'))
-    FileOut.write(original_length.to_bytes(4, 'big'))
-    PackedBits = BitPacker(Bits)
-    ChunkedDataWriter(FileOut, PackedBits)
-
-def TansEncode(data: bytes):
-    FreqTable = dict(Counter(data))
-    TotalFreq = sum(FreqTable.values())
-    TableSize = PowerTwo(TotalFreq)
-    MAX_TableSize = 1 << 20  
-    if TableSize > MAX_TableSize or len(FreqTable) < 2:
-        raise TANSCompressionSkipped("!!! File not suitable for TANS compression (table size too large or too few Symbols).")
-
-    MaxFreq = max(FreqTable.values())
-    if MaxFreq / TotalFreq > 0.95:
-        raise TANSCompressionSkipped("!!! Frequency distribution too skewed for TANS compression.")
-
-    try:
-        tans = TANS(FreqTable, TableSize=TableSize)
-        FinalState, EncodedBits = tans.Encode(data)
-    except Exception as e:
-        raise TANSCompressionSkipped(f"!!! TANS encoding failed: {e}")
-    while isinstance(FinalState, list):
-        FinalState = FinalState[-1]
-
-    return FreqTable, EncodedBits, FinalState, TableSize
-
-def FileCompressor(InputPath: str, OutputPath: str, method: str = 'lzw'):
-    try:
-        with open(InputPath, 'rb') as f:
-            data = f.read()
-
-        if len(data) == 0:
-            raise ValueError(f"File {InputPath} is empty and cannot be compressed.")
+def LZWPresetWriter(FileOut, preset):
+    ValPresetId(preset.Id)
+    PresetId = preset.Id.encode('utf-8')
+    FileOut.write(bytes([len(PresetId)]))
+    FileOut.write(PresetId)
+    FileOut.write(preset.Checksum().to_bytes(4, 'big'))
+
+def ChunkTableWriter(FileOut, PackedChunks, RawLengths):
+    FileOut.write(len(PackedChunks).to_bytes(4, 'big'))
+    for packed, RawLen in zip(PackedChunks, RawLengths):
+        FileOut.write(len(packed).to_bytes(4, 'big'))
+        FileOut.write(RawLen.to_bytes(4, 'big'))
+    for packed in PackedChunks:
+        FileOut.write(packed)
+
+def LZWStreamCompressor(FileIn, FileOut, max_bits: int = DEFAULT_MAX_CODE_BITS, lzw_reset: bool = True):
+    Encoder = LZWEncoder(max_bits, lzw_reset)
+    FileOut.write(bytes([max_bits | (LZW_RESET_FLAG if lzw_reset else 0)]))
+    while True:
+        block = FileIn.read(STREAM_BLOCK_SIZE)
+        if not block:
+            break
+        ChunkedDataWriter(FileOut, Encoder.Feed(block))
+    ChunkedDataWriter(FileOut, Encoder.Flush())
+
+STREAM_COMPRESSORS = {
+    'lzw-stream': LZWStreamCompressor,
+}
 
-        with open(OutputPath, 'wb') as FileOut:
-            if method == 'lzw':
-                codes = list(LZWParallel(data))
-                TotalCodeBytes = b''.join(code.to_bytes(2, 'big') for code in codes)
-                FileOut.write(MAGIC_HEADERS[method])
-                FileOut.write(len(TotalCodeBytes).to_bytes(4, 'big'))
-                FileOut.write(TotalCodeBytes)
+def PresenceBytes(Symbols) -> bytes:
+    Groups = 0
+    Masks = [0] * 32
+    for Sym in Symbols:
+        Groups |= 1 << (31 - (Sym >> 3))
+        Masks[Sym >> 3] |= 0x80 >> (Sym & 7)
+    return Groups.to_bytes(4, 'big') + bytes(Mask for Mask in Masks if Mask)
 
-            elif method == 'rle':
-                RleData = RLE_Encode(data)
-                FileOut.write(MAGIC_HEADERS[method])
-                ChunkedDataWriter(FileOut, RleData)
+def CompactCountsBytes(Counts) -> bytes:
+    return PresenceBytes(Counts) + b''.join(VarintBytes(Counts[Sym] - 1) for Sym in sorted(Counts))
 
-            elif method == 'rle+lzw':
-                RleData = RLE_Encode(data)
-                codes = LZW_Compress(RleData)
-                TotalCodeBytes = b''.join(code.to_bytes(2, 'big') for code in codes)
-                FileOut.write(MAGIC_HEADERS[method])
-                ChunkedDataWriter(FileOut, TotalCodeBytes)
+def TansTableEncode(data: bytes, TableLog: int = TANS_DEFAULT_TABLE_LOG):
+    Codec = GetTANSCodec(dict(Counter(data)), TableLog)
+    State, Pad, Payload = Codec.Encode(data)
+    return Codec, State, Pad, Payload
 
-            elif method == 'tans':
-                FreqTable, EncodedBits, FinalState, TableSize = TansEncode(data)
-                FileOut.write(MAGIC_HEADERS[method])
-                TansEncoded_Data_Writer(FileOut, FreqTable, EncodedBits, FinalState, len(data), TableSize=TableSize)
+def TansCodesEncode(codes: List[int], TableLog: int = TANS_DEFAULT_TABLE_LOG):
+    Codec = GetTANSCodec(dict(Counter(CodeBuckets(codes))), TableLog)
+    State, Pad, Payload = Codec.EncodeCodes(codes)
+    return Codec, State, Pad, Payload
 
-            elif method == 'rle+tans':
-                RleData = RLE_Encode(data)
-                FreqTable, EncodedBits, FinalState, TableSize = TansEncode(RleData)
-                FileOut.write(MAGIC_HEADERS[method])
-                TansEncoded_Data_Writer(FileOut, FreqTable, EncodedBits, FinalState, len(RleData), TableSize=TableSize)
+def NormCountsWriter(FileOut, Counts):
+    FileOut.write(CompactCountsBytes(Counts))
 
-            elif method == 'lzw+tans':
-                lzwCodes = LZW_Compress(data)
-                lzwBytes = b''.join(code.to_bytes(2, 'big') for code in lzwCodes)
-                FreqTable, EncodedBits, FinalState, TableSize = TansEncode(lzwBytes)
-                FileOut.write(MAGIC_HEADERS[method])
-                TansEncoded_Data_Writer(FileOut, FreqTable, EncodedBits, FinalState, len(lzwBytes), TableSize=TableSize)
+def TansCountsWriter(FileOut, Codec):
+    FileOut.write(bytes([Codec.TableLog | TANS_COMPACT_FLAG]))
+    NormCountsWriter(FileOut, Codec.Counts)
 
-            elif method == 'rle+lzw+tans':
-                RleData = RLE_Encode(data)
-                lzwCodes = LZW_Compress(RleData)
-                lzwBytes = b''.join(code.to_bytes(2, 'big') for code in lzwCodes)
-                FreqTable, EncodedBits, FinalState, TableSize = TansEncode(lzwBytes)
+def TansTableWriter(FileOut, Codec, State, Pad, Payload, original_length):
+    TansCountsWriter(FileOut, Codec)
+    FileOut.write(original_length.to_bytes(4, 'big'))
+    FileOut.write(State.to_bytes(2, 'big'))
+    FileOut.write(bytes([Pad]))
+    ChunkedDataWriter(FileOut, Payload)
+
+def TansCountsSize(Counts) -> int:
+    return len(CompactCountsBytes(Counts))
+
+def ChooseCoding(data: bytes, TableLog: int = TANS_DEFAULT_TABLE_LOG) -> int:
+    Sample = EntropySample(data)
+    if not Sample:
+        return CODING_STORED
+    Scale = len(data) / len(Sample)
+    FreqTable = dict(Counter(Sample))
+    Counts = NormalizeFrequencies(FreqTable, 1 << TableLog)
+    Costs = {
+        CODING_STORED: len(data),
+        CODING_RLE: len(RLE2_Encode(Sample)) * Scale,
+        CODING_TANS: SampledCodedBits(FreqTable, Counts, TableLog, Scale) / 8 + TansCountsSize(Counts) + 8,
+    }
+    return min(Costs, key=Costs.get)
+
+def AutoCodingWriter(FileOut, data: bytes, TableLog: int = TANS_DEFAULT_TABLE_LOG):
+    Coding = ChooseCoding(data, TableLog)
+    FileOut.write(bytes([Coding]))
+    if Coding == CODING_TANS:
+        Codec, State, Pad, Payload = TansTableEncode(data, TableLog)
+        TansTableWriter(FileOut, Codec, State, Pad, Payload, len(data))
+    elif Coding == CODING_RLE:
+        ChunkedDataWriter(FileOut, RLE2_Encode(data))
+    else:
+        ChunkedDataWriter(FileOut, data)
+
+def PlanTansBlocks(data: bytes, block_size: int = TANS_BLOCK_SIZE, TableLog: int = TANS_DEFAULT_TABLE_LOG):
+    ValTableLog(TableLog)
+    Plan = []
+    Previous = None
+    for Start in range(0, len(data), block_size):
+        End = min(Start + block_size, len(data))
+        FreqTable = dict(Counter(data[Start:End]))
+        Counts = NormalizeFrequencies(FreqTable, 1 << TableLog)
+        OwnCost = CodedBits(FreqTable, Counts, TableLog) + 8 * TansCountsSize(Counts)
+        Reused = Previous is not None and CodedBits(FreqTable, Previous, TableLog) <= OwnCost
+        if Reused:
+            Counts = Previous
+        Plan.append((Start, End, Counts, Reused))
+        Previous = Counts
+    return Plan
+
+def TansBlocksEncode(data: bytes, block_size: int = TANS_BLOCK_SIZE, TableLog: int = TANS_DEFAULT_TABLE_LOG):
+    Plan = PlanTansBlocks(data, block_size, TableLog)
+    Executor = GetPool().Start()
+    futures = [Executor.submit(EncodeLane, Counts, TableLog, data[Start:End]) for Start, End, Counts, _ in Plan]
+    return [(Counts, Reused, End - Start) + future.result()
+            for (Start, End, Counts, Reused), future in zip(Plan, futures)]
+
+def TansBlocksWriter(FileOut, Blocks, TableLog):
+    FileOut.write(bytes([TableLog | TANS_COMPACT_FLAG]))
+    FileOut.write(len(Blocks).to_bytes(4, 'big'))
+    for Counts, Reused, RawLen, State, Pad, Payload in Blocks:
+        FileOut.write(bytes([Reused]))
+        if not Reused:
+            NormCountsWriter(FileOut, Counts)
+        FileOut.write(RawLen.to_bytes(4, 'big'))
+        FileOut.write(State.to_bytes(2, 'big'))
+        FileOut.write(bytes([Pad]))
+        FileOut.write(len(Payload).to_bytes(4, 'big'))
+    for Block in Blocks:
+        FileOut.write(Block[-1])
+
+def PlanContextTables(data: bytes, TableLog: int = TANS_DEFAULT_TABLE_LOG):
+    ValTableLog(TableLog)
+    Fallback = NormalizeFrequencies(dict(Counter(data)), 1 << TableLog)
+    Tables = {}
+    for Context, FreqTable in sorted(ContextFrequencies(data).items()):
+        Counts = NormalizeFrequencies(FreqTable, 1 << TableLog)
+        Gain = CodedBits(FreqTable, Fallback, TableLog) - CodedBits(FreqTable, Counts, TableLog)
+        if Gain > 8 * TansCountsSize(Counts) + TANS_CONTEXT_MIN_GAIN:
+            Tables[Context] = Counts
+    return Fallback, Tables
+
+def TansContextEncode(data: bytes, TableLog: int = TANS_DEFAULT_TABLE_LOG):
+    Fallback, Tables = PlanContextTables(data, TableLog)
+    FallbackCodec = GetTANSCodec(Fallback, TableLog, normalized=True)
+    Codecs = [GetTANSCodec(Tables[Context], TableLog, normalized=True) if Context in Tables else FallbackCodec
+              for Context in range(256)]
+    return (Fallback, Tables) + EncodeContexts(data, Codecs)
+
+def TansContextWriter(FileOut, Fallback, Tables, TableLog, State, Pad, Payload, original_length):
+    FileOut.write(bytes([TableLog | TANS_COMPACT_FLAG]))
+    NormCountsWriter(FileOut, Fallback)
+    FileOut.write(PresenceBytes(Tables))
+    for Context in sorted(Tables):
+        NormCountsWriter(FileOut, Tables[Context])
+    FileOut.write(original_length.to_bytes(4, 'big'))
+    FileOut.write(State.to_bytes(2, 'big'))
+    FileOut.write(bytes([Pad]))
+    ChunkedDataWriter(FileOut, Payload)
+
+def PipelineWriter(FileOut, data: bytes, method: str, max_bits: int = DEFAULT_MAX_CODE_BITS, lzw_reset: bool = True,
+                   lzw_chunk_size: int = LZW_CHUNK_SIZE, preset=None, tans_table_log: int = TANS_DEFAULT_TABLE_LOG):
+    if method == 'lzw':
+        lzw_chunk_size = LZWChunkSize(lzw_chunk_size, max_bits)
+        PackedChunks = LZWParallelPacked(data, lzw_chunk_size, max_bits=max_bits, reset=lzw_reset, preset=preset)
+        FileOut.write(bytes([max_bits | (LZW_RESET_FLAG if lzw_reset else 0) | (LZW_PRESET_FLAG if preset else 0)]))
+        if preset:
+            LZWPresetWriter(FileOut, preset)
+        RawLengths = [min(lzw_chunk_size, len(data) - i) for i in range(0, len(data), lzw_chunk_size)]
+        ChunkTableWriter(FileOut, PackedChunks, RawLengths)
+
+    elif method == 'rle':
+        Blocks, RawLengths = RLEParallelBlocks(data)
+        ChunkTableWriter(FileOut, Blocks, RawLengths)
+
+    elif method == 'rle2':
+        RleData = RLE2_Encode(data)
+        ChunkedDataWriter(FileOut, RleData)
+
+    elif method == 'rle+lzw':
+        RleData = RLE_EncodeParallel(data)
+        codes = LZW_CompressTrie(RleData)
+        TotalCodeBytes = CodesToBytes(codes, 2)
+        ChunkedDataWriter(FileOut, TotalCodeBytes)
+
+    elif method == 'tans':
+        ValTableLog(tans_table_log)
+        AutoCodingWriter(FileOut, data, tans_table_log)
+
+    elif method == 'tans2':
+        Codec, State, Pad, Payload = TansTableEncode(data, tans_table_log)
+        TansTableWriter(FileOut, Codec, State, Pad, Payload, len(data))
+
+    elif method == 'tans-blocks':
+        Blocks = TansBlocksEncode(data, TableLog=tans_table_log)
+        TansBlocksWriter(FileOut, Blocks, tans_table_log)
+
+    elif method == 'tans-o1':
+        Fallback, Tables, State, Pad, Payload = TansContextEncode(data, tans_table_log)
+        TansContextWriter(FileOut, Fallback, Tables, tans_table_log, State, Pad, Payload, len(data))
+
+    elif method == 'rle+tans':
+        ValTableLog(tans_table_log)
+        RleData = RLE_EncodeParallel(data)
+        AutoCodingWriter(FileOut, RleData, tans_table_log)
+
+    elif method == 'lzw+tans':
+        lzwCodes = LZW_CompressTrie(data)
+        Codec, State, Pad, Payload = TansCodesEncode(lzwCodes, tans_table_log)
+        TansTableWriter(FileOut, Codec, State, Pad, Payload, len(lzwCodes))
+
+    elif method == 'rle+lzw+tans':
+        RleData = RLE_EncodeParallel(data)
+        lzwCodes = LZW_CompressTrie(RleData)
+        Codec, State, Pad, Payload = TansCodesEncode(lzwCodes, tans_table_log)
+        TansTableWriter(FileOut, Codec, State, Pad, Payload, len(lzwCodes))
+
+    else:
+        raise ValueError(f"Unsupported compression method: {method}")
+
+def ValBlockSize(block_size: int):
+    if not CONTAINER_MIN_BLOCK_SIZE <= block_size <= CONTAINER_MAX_BLOCK_SIZE:
+        raise ValueError(f"Container block size must be between {CONTAINER_MIN_BLOCK_SIZE} and "
+                         f"{CONTAINER_MAX_BLOCK_SIZE} bytes, got {block_size}")
+
+def ContainerHeaderWriter(FileOut, method: str, original_size: int, block_size: int):
+    Header = bytes([CONTAINER_VERSION]) + MAGIC_HEADERS[method] + original_size.to_bytes(8, 'big') + block_size.to_bytes(4, 'big')
+    FileOut.write(CONTAINER_MAGIC)
+    FileOut.write(Header)
+    FileOut.write(zlib.crc32(Header).to_bytes(4, 'big'))
+
+def ContainerBlockWriter(FileOut, payload: bytes, raw_length: int):
+    FileOut.write(len(payload).to_bytes(4, 'big'))
+    FileOut.write(raw_length.to_bytes(4, 'big'))
+    FileOut.write(zlib.crc32(payload).to_bytes(4, 'big'))
+    FileOut.write(payload)
+
+def ContainerWriter(FileIn, FileOut, original_size: int, method: str, block_size: int = CONTAINER_BLOCK_SIZE, **options):
+    ValBlockSize(block_size)
+    ContainerHeaderWriter(FileOut, method, original_size, block_size)
+    Remaining = original_size
+    while Remaining:
+        Block = FileIn.read(min(block_size, Remaining))
+        if not Block:
+            raise EOFError(f"Input ended {Remaining} bytes before its recorded size of {original_size}")
+        Remaining -= len(Block)
+        Buffer = BytesIO()
+        PipelineWriter(Buffer, Block, method, **options)
+        ContainerBlockWriter(FileOut, Buffer.getvalue(), len(Block))
+        del Block, Buffer
+
+def FileCompressor(InputPath: str, OutputPath: str, method: str = 'lzw', max_bits: int = DEFAULT_MAX_CODE_BITS,
+                   lzw_reset: bool = True, lzw_chunk_size: int = LZW_CHUNK_SIZE, lzw_preset: str = None,
+                   tans_table_log: int = TANS_DEFAULT_TABLE_LOG, block_size: int = CONTAINER_BLOCK_SIZE):
+    try:
+        if method not in MAGIC_HEADERS:
+            raise ValueError(f"Unsupported compression method: {method}")
+        if lzw_preset and method not in PRESET_METHODS:
+            raise ValueError(f"LZW presets are not supported by method {method}")
+
+        if method in STREAM_COMPRESSORS:
+            if os.path.getsize(InputPath) == 0:
+                raise ValueError(f"File {InputPath} is empty and cannot be compressed.")
+            with open(InputPath, 'rb') as FileIn, open(OutputPath, 'wb') as FileOut:
                 FileOut.write(MAGIC_HEADERS[method])
-                TansEncoded_Data_Writer(FileOut, FreqTable, EncodedBits, FinalState, len(lzwBytes), TableSize=TableSize)
-
-            else:
-                raise ValueError(f"Unsupported compression method: {method}")
-
-    except TANSCompressionSkipped as e:
-        print(f"!!! Skipped TANS compression for {InputPath}: {e}")
-        raise
+                STREAM_COMPRESSORS[method](FileIn, FileOut, max_bits, lzw_reset)
+            return
+
+        ValBlockSize(block_size)
+        preset = LoadLZWPreset(lzw_preset) if lzw_preset else None
+        with open(InputPath, 'rb') as FileIn:
+            OriginalSize = os.fstat(FileIn.fileno()).st_size
+            if OriginalSize == 0:
+                raise ValueError(f"File {InputPath} is empty and cannot be compressed.")
+            with open(OutputPath, 'wb') as FileOut:
+                ContainerWriter(FileIn, FileOut, OriginalSize, method, block_size, max_bits=max_bits,
+                                lzw_reset=lzw_reset, lzw_chunk_size=lzw_chunk_size, preset=preset,
+                                tans_table_log=tans_table_log)
 
     except Exception as e:
         print(f"X Compression failed for {InputPath} with method {method}: {e}")
@@ -158,10 +346,6 @@ def SingleFileProcessor(args):
 
         return (File, OriginalSize, CompSize)
 
-    except TANSCompressionSkipped as skip_exc:
-        print(f"!!! Skipped TANS compression for {File}: {skip_exc}")
-        return None
-
     except Exception as e:
         print(f"X Compression failed for {File}: {e}")
         traceback.print_exc()
@@ -1,32 +1,46 @@
 import os
-from lzw import LZWDecompressFromBytes, ParallelDecompLZW, LZW_Decompress
-from rle import RLE_Decode
+import random
+import tempfile
+import zlib
+from collections import deque
+from lzw import (LZWDecompressFromBytes, ParallelDecompLZW, ParallelDecompLZWTable, LZWDecoder, LoadLZWPreset,
+                 LZW_DecompressBuffer, LZW_RESET_FLAG, LZW_PRESET_FLAG, LZW_CODE_BITS_MASK)
+from compress import FileCompressor, MAGIC_HEADERS, CONTAINER_MIN_BLOCK_SIZE
+from pool import GetPool
+from rle import RLE_DecodeSpans, RLE2_Decode, RLEParallelDecode
+from bitio import BitReader, BytesToCodes, ReadVarint
 import traceback
 from io import BytesIO
-from tans import TANS
+from tans import (GetTANS, GetTANSCodec, TANSCodec, DecodeLane, DecodeContexts, ValTableLog, TANS_TABLE_LOG_MASK,
+                  TANS_COMPACT_FLAG, CODING_STORED, CODING_RLE, CODING_TANS)
 
 
+CONTAINER_VERSION = 2
+CONTAINER_HEADER_SIZE = 17
+CONTAINER_INFLIGHT_BLOCKS = 2 * (os.cpu_count() or 1)
+CONTAINER_PARALLEL_PIPELINES = {'rle2', 'rle+lzw', 'tans', 'tans2', 'tans-o1', 'rle+tans', 'lzw+tans', 'rle+lzw+tans'}
+
 MAGIC_HEADERS_REVERSE = {
-    b'LZ__': 'lzw',
-    b'rle_': 'rle',
+    b'CTR2': 'container',
+    b'LZ__': 'lzw16',
+    b'LZCT': 'lzw',
+    b'LZST': 'lzw-stream',
+    b'rle_': 'rle-serial',
+    b'RLBK': 'rle',
+    b'RLE2': 'rle2',
     b'MLZW': 'rle+lzw',
-    b'TANS': 'tans',
-    b'RTNS': 'rle+tans',
-    b'LTNS': 'lzw+tans',
-    b'RLTN': 'rle+lzw+tans',
+    b'TANS': 'tans-legacy',
+    b'TANA': 'tans',
+    b'TAN2': 'tans2',
+    b'TANB': 'tans-blocks',
+    b'TAO1': 'tans-o1',
+    b'RTNS': 'rle+tans-legacy',
+    b'RTN2': 'rle+tans',
+    b'LTNS': 'lzw+tans-bytes',
+    b'RLTN': 'rle+lzw+tans-bytes',
+    b'LTN2': 'lzw+tans',
+    b'RLT2': 'rle+lzw+tans',
 }
-def UnpackBits(PackedBits: bytes, length: int) -> list[int]:
-    Bits = []
-    for b in PackedBits:
-        high = (b >> 4) & 0xF
-        low = b & 0xF
-        Bits.append(high)
-        if len(Bits) < length:
-            Bits.append(low)
-        if len(Bits) >= length:
-            break
-    return Bits[:length]
-
 def PowerTwo(x: int) -> int:
     return 1 << (x - 1).bit_length()
 
@@ -42,7 +56,7 @@ def ChunkReader(f) -> bytes:
         raise EOFError("Incomplete chunk data.")
     return data
 
-def TotalChunksReader(f) -> bytes:
+def ChunksListReader(f) -> list[bytes]:
     chunks = []
     while True:
         try:
@@ -50,12 +64,13 @@ def TotalChunksReader(f) -> bytes:
             chunks.append(chunk)
         except EOFError:
             break
-    return b''.join(chunks)
+    return chunks
 
-def ConvertBytesToCodes(data: bytes, code_size_bytes=2) -> list[int]:
-    if len(data) % code_size_bytes != 0:
-        raise ValueError("Data length is not multiple of code size")
-    return [int.from_bytes(data[i:i+code_size_bytes], 'big') for i in range(0, len(data), code_size_bytes)]
+def TotalChunksReader(f) -> bytes:
+    return b''.join(ChunksListReader(f))
+
+def ConvertBytesToCodes(data: bytes, code_size_bytes=2):
+    return BytesToCodes(data, code_size_bytes)
 
 def BytesInts(f, size: int, error_msg: str) -> int:
     data = f.read(size)
@@ -68,6 +83,23 @@ def TansBitsReader(f):
     Bits = [BytesInts(f, 2, "Incomplete bit value") for _ in range(BitsLength)]
     return Bits
 
+def VarintReader(f, error_msg: str) -> int:
+    Encoded = bytearray()
+    while True:
+        Byte = BytesInts(f, 1, error_msg)
+        Encoded.append(Byte)
+        if Byte < 0x80:
+            return ReadVarint(Encoded, 0)[0]
+
+def PresenceReader(f) -> list[int]:
+    Groups = BytesInts(f, 4, "Incomplete tANS symbol groups")
+    Symbols = []
+    for Group in range(32):
+        if Groups >> (31 - Group) & 1:
+            Mask = BytesInts(f, 1, "Incomplete tANS symbol bitmap")
+            Symbols.extend(Group * 8 + Bit for Bit in range(8) if Mask & (0x80 >> Bit))
+    return Symbols
+
 def HandlerTANS(f):
     TableSize = BytesInts(f, 4, "Incomplete TANS table size")
     if TableSize & (TableSize - 1) != 0:
@@ -90,10 +122,11 @@ def HandlerTANS(f):
 
     PackedBits_bits = f.read()
 
-    Bits = UnpackBits(PackedBits_bits, OriginalLength)
+    Reader = BitReader(PackedBits_bits)
+    Bits = Reader.ReadMany(min(OriginalLength, Reader.Remaining() // 4), 4)
 
     try:
-        tans = TANS(FreqTable, TableSize=TableSize)
+        tans = GetTANS(FreqTable, TableSize)
         Decoded = tans.Decode(FinalState, Bits, OriginalLength)
     except Exception as e:
         print(f"!!! Warning: TANS decompression failed: {e}. Skipping this file.")
@@ -101,6 +134,79 @@ def HandlerTANS(f):
 
     return bytes(Decoded)
 
+def NormCountsReader(f) -> dict[int, int]:
+    return {Sym: VarintReader(f, "Incomplete tANS symbol count") + 1 for Sym in PresenceReader(f)}
+
+def TableLogReader(f) -> int:
+    Flags = BytesInts(f, 1, "Incomplete tANS table log")
+    if not Flags & TANS_COMPACT_FLAG:
+        raise ValueError("tANS header is missing the compact table flag")
+    TableLog = Flags & TANS_TABLE_LOG_MASK
+    ValTableLog(TableLog)
+    return TableLog
+
+def TansTableReader(f) -> TANSCodec:
+    TableLog = TableLogReader(f)
+    return GetTANSCodec(NormCountsReader(f), TableLog, normalized=True)
+
+def HandlerTANS2(f):
+    Codec = TansTableReader(f)
+    OriginalLength = BytesInts(f, 4, "Incomplete original data length")
+    State = BytesInts(f, 2, "Incomplete tANS final state")
+    Pad = BytesInts(f, 1, "Incomplete tANS padding")
+    return Codec.Decode(State, Pad, TotalChunksReader(f), OriginalLength)
+
+def AutoCodingReader(f):
+    Coding = BytesInts(f, 1, "Incomplete entropy stage coding")
+    if Coding == CODING_TANS:
+        return HandlerTANS2(f)
+    if Coding == CODING_RLE:
+        return RLE2_Decode(TotalChunksReader(f))
+    if Coding == CODING_STORED:
+        return TotalChunksReader(f)
+    raise ValueError(f"Unknown entropy stage coding {Coding}")
+
+def TANSCodesReader(f):
+    Codec = TansTableReader(f)
+    CodeCount = BytesInts(f, 4, "Incomplete LZW code count")
+    State = BytesInts(f, 2, "Incomplete tANS final state")
+    Pad = BytesInts(f, 1, "Incomplete tANS padding")
+    return Codec.DecodeCodes(State, Pad, TotalChunksReader(f), CodeCount)
+
+def HandlerTANSContext(f):
+    TableLog = TableLogReader(f)
+    Fallback = GetTANSCodec(NormCountsReader(f), TableLog, normalized=True)
+    Codecs = [Fallback] * 256
+    for Context in PresenceReader(f):
+        Codecs[Context] = GetTANSCodec(NormCountsReader(f), TableLog, normalized=True)
+    OriginalLength = BytesInts(f, 4, "Incomplete original data length")
+    State = BytesInts(f, 2, "Incomplete tANS final state")
+    Pad = BytesInts(f, 1, "Incomplete tANS padding")
+    return DecodeContexts(Codecs, State, Pad, TotalChunksReader(f), OriginalLength)
+
+def HandlerTANSBlocks(f):
+    TableLog = TableLogReader(f)
+    BlockCount = BytesInts(f, 4, "Incomplete tANS block count")
+    Blocks = []
+    Counts = None
+    for i in range(BlockCount):
+        if BytesInts(f, 1, "Incomplete tANS block flag"):
+            if Counts is None:
+                raise ValueError(f"tANS block {i} reuses a table but has no previous block")
+        else:
+            Counts = NormCountsReader(f)
+        Blocks.append((Counts, BytesInts(f, 4, "Incomplete tANS block length"), BytesInts(f, 2, "Incomplete tANS block state"),
+                       BytesInts(f, 1, "Incomplete tANS block padding"), BytesInts(f, 4, "Incomplete tANS block size")))
+
+    Executor = GetPool().Start()
+    futures = []
+    for Counts, RawLen, State, Pad, PayloadSize in Blocks:
+        payload = f.read(PayloadSize)
+        if len(payload) < PayloadSize:
+            raise EOFError(f"Incomplete tANS block: expected {PayloadSize} bytes, got {len(payload)}")
+        futures.append(Executor.submit(DecodeLane, Counts, TableLog, State, Pad, payload, RawLen))
+    return b''.join(future.result() for future in futures)
+
 def HandlerLZW(f):
     try:
         raw = TotalChunksReader(f)
@@ -113,22 +219,75 @@ def HandlerLZW(f):
     raw = f.read()
     return LZWDecompressFromBytes(raw)
 
+def ChunkTableReader(f) -> list[tuple[int, int]]:
+    ChunkCount = BytesInts(f, 4, "Incomplete chunk table count")
+    return [(BytesInts(f, 4, "Incomplete chunk table entry"), BytesInts(f, 4, "Incomplete chunk table entry"))
+            for _ in range(ChunkCount)]
+
+def LZWPresetReader(f):
+    IdLength = BytesInts(f, 1, "Incomplete LZW preset id length")
+    PresetId = f.read(IdLength)
+    if len(PresetId) < IdLength:
+        raise EOFError("Incomplete LZW preset id")
+    Checksum = BytesInts(f, 4, "Incomplete LZW preset checksum")
+    preset = LoadLZWPreset(PresetId.decode('utf-8'))
+    if preset.Checksum() != Checksum:
+        raise ValueError(f"LZW preset {preset.Id!r} does not match the one used for compression")
+    return preset
+
+def HandlerLZWTable(f):
+    Flags = BytesInts(f, 1, "Incomplete LZW code width")
+    MaxBits = Flags & LZW_CODE_BITS_MASK
+    preset = LZWPresetReader(f) if Flags & LZW_PRESET_FLAG else None
+    Table = ChunkTableReader(f)
+    PayloadSize = sum(PackedLen for PackedLen, _ in Table)
+    payload = f.read(PayloadSize)
+    if len(payload) < PayloadSize:
+        raise EOFError(f"Incomplete LZW payload: expected {PayloadSize} bytes, got {len(payload)}")
+    return ParallelDecompLZWTable(payload, Table, MaxBits, bool(Flags & LZW_RESET_FLAG), preset)
+
+def HandlerLZWStream(f, f_out):
+    Flags = BytesInts(f, 1, "Incomplete LZW code width")
+    Decoder = LZWDecoder(Flags & LZW_CODE_BITS_MASK, bool(Flags & LZW_RESET_FLAG))
+    while True:
+        try:
+            chunk = ChunkReader(f)
+        except EOFError:
+            break
+        f_out.write(Decoder.Feed(chunk))
+    f_out.write(Decoder.Flush())
+
+STREAM_HANDLERS = {
+    'lzw-stream': HandlerLZWStream,
+}
+
 def HandlerRLE(f):
     raw = TotalChunksReader(f)
     print(f"Raw encoded RLE data size read: {len(raw)}")
-    Decoded = RLE_Decode(raw)
+    Decoded = RLE_DecodeSpans(raw)
     print(f"Decoded data size: {len(Decoded)}")
     return Decoded
 
+def HandlerRLEBlocks(f):
+    Table = ChunkTableReader(f)
+    PayloadSize = sum(PackedLen for PackedLen, _ in Table)
+    payload = f.read(PayloadSize)
+    if len(payload) < PayloadSize:
+        raise EOFError(f"Incomplete RLE payload: expected {PayloadSize} bytes, got {len(payload)}")
+    return RLEParallelDecode(payload, Table)
+
+def HandlerRLE2(f):
+    return RLE2_Decode(TotalChunksReader(f))
+
 def HandlerRLE_then_lzw(f):
     RawLZW = TotalChunksReader(f)
     codes = ConvertBytesToCodes(RawLZW, 2)
-    LZW_fin = LZW_Decompress(codes)
-    return RLE_Decode(LZW_fin)
+    LZW_fin = LZW_DecompressBuffer(codes)
+    return RLE_DecodeSpans(LZW_fin)
 
 def HandlerRLE_ThenTANS(f):
     RawRLE = TotalChunksReader(f)
-    RLEDecoded = RLE_Decode(RawRLE)
+    RLEDecoded = RLE_DecodeSpans(RawRLE)
 
     f_tans = BytesIO(RLEDecoded)
     try:
@@ -142,7 +301,7 @@ def HandlerRLE_ThenTANS(f):
 def HandlerLZW_ThenTANS(f):
     RawLZW = TotalChunksReader(f)
     codes = ConvertBytesToCodes(RawLZW, 2)
-    LZW_fin = LZW_Decompress(codes)
+    LZW_fin = LZW_DecompressBuffer(codes)
 
     f_tans = BytesIO(LZW_fin)
     try:
@@ -167,9 +326,9 @@ def HandlerRLELZWThenTANS(f):
         return None
 
     codes = ConvertBytesToCodes(tans_out, 2)
-    LZW_fin = LZW_Decompress(codes)
+    LZW_fin = LZW_DecompressBuffer(codes)
 
-    RLEDecoded = RLE_Decode(LZW_fin)
+    RLEDecoded = RLE_DecodeSpans(LZW_fin)
 
     return RLEDecoded
 
@@ -179,7 +338,130 @@ def ValStreamPos(f, expected_pos: int, context: str):
         raise ValueError(f"Stream position mismatch in {context}: "
                         f"expected={expected_pos}, got={CurrentPosition}")
 
-def FileDecompressor(InputPath: str, OutputPath: str) -> bool:
+def DecodePipeline(f, method: str) -> bytes:
+    handlers = {
+        'lzw': lambda: HandlerLZWTable(f),
+        'lzw16': lambda: HandlerLZW(f),
+        'rle': lambda: HandlerRLEBlocks(f),
+        'rle-serial': lambda: HandlerRLE(f),
+        'rle2': lambda: HandlerRLE2(f),
+        'rle+lzw': lambda: HandlerRLE_then_lzw(f),
+        'tans-legacy': lambda: HandlerTANS(f),
+        'tans': lambda: AutoCodingReader(f),
+        'tans2': lambda: HandlerTANS2(f),
+        'tans-blocks': lambda: HandlerTANSBlocks(f),
+        'tans-o1': lambda: HandlerTANSContext(f),
+        'rle+tans-legacy': lambda: HandlerRLE_ThenTANS(f),
+        'rle+tans': lambda: RLE_DecodeSpans(AutoCodingReader(f)),
+        'lzw+tans-bytes': lambda: HandlerLZW_ThenTANS(f),
+        'rle+lzw+tans-bytes': lambda: HandlerRLELZWThenTANS(f),
+        'lzw+tans': lambda: LZW_DecompressBuffer(TANSCodesReader(f)),
+        'rle+lzw+tans': lambda: RLE_DecodeSpans(LZW_DecompressBuffer(TANSCodesReader(f))),
+    }
+
+    handler = handlers.get(method)
+    if not handler:
+        raise ValueError(f"Unsupported compression method: {method}")
+
+    return handler()
+
+def ContainerHeaderReader(f):
+    Header = f.read(CONTAINER_HEADER_SIZE)
+    if len(Header) < CONTAINER_HEADER_SIZE:
+        raise EOFError(f"Incomplete container header: expected {CONTAINER_HEADER_SIZE} bytes, got {len(Header)}")
+    if zlib.crc32(Header) != BytesInts(f, 4, "Incomplete container header checksum"):
+        raise ValueError("Container header checksum mismatch")
+    if Header[0] != CONTAINER_VERSION:
+        raise ValueError(f"Unsupported container version {Header[0]}")
+    method = MAGIC_HEADERS_REVERSE.get(Header[1:5])
+    if method is None or method == 'container' or method in STREAM_HANDLERS:
+        raise ValueError(f"Invalid container pipeline: {Header[1:5]}")
+    BlockSize = int.from_bytes(Header[13:17], 'big')
+    if BlockSize == 0:
+        raise ValueError("Container block size must be positive")
+    return method, int.from_bytes(Header[5:13], 'big'), BlockSize
+
+def ContainerIndexReader(f, OriginalSize: int, BlockSize: int) -> list[tuple[int, int, int, int]]:
+    FileSize = os.fstat(f.fileno()).st_size
+    Index = []
+    for Start in range(0, OriginalSize, BlockSize):
+        PackedLength = BytesInts(f, 4, "Incomplete container block length")
+        RawLength = BytesInts(f, 4, "Incomplete container block raw length")
+        Checksum = BytesInts(f, 4, "Incomplete container block checksum")
+        if RawLength != min(BlockSize, OriginalSize - Start):
+            raise ValueError(f"Container block at {Start} has raw length {RawLength}, expected {min(BlockSize, OriginalSize - Start)}")
+        Index.append((f.tell(), PackedLength, RawLength, Checksum))
+        if f.seek(PackedLength, 1) > FileSize:
+            raise EOFError(f"Incomplete container block at {Start}: payload runs past end of file")
+    if f.tell() != FileSize:
+        raise ValueError(f"Unexpected {FileSize - f.tell()} trailing bytes after container blocks")
+    return Index
+
+def DecodeContainerBlock(payload: bytes, method: str, RawLength: int) -> bytes:
+    data = DecodePipeline(BytesIO(payload), method)
+    if data is None or len(data) != RawLength:
+        raise ValueError(f"Container block decoded to {None if data is None else len(data)} bytes, expected {RawLength}")
+    return data
+
+def PartialPath(OutputPath: str) -> str:
+    return f"{OutputPath}.part"
+
+def DiscardPartial(TempPath: str):
+    if os.path.exists(TempPath):
+        os.remove(TempPath)
+
+def ContainerDecompressor(f, OutputPath: str, skip_corrupt: bool = False) -> bool:
+    method, OriginalSize, BlockSize = ContainerHeaderReader(f)
+    Index = ContainerIndexReader(f, OriginalSize, BlockSize)
+    TempPath = PartialPath(OutputPath)
+    try:
+        Corrupt = ContainerBlocksWriter(f, TempPath, method, Index, OriginalSize, BlockSize, skip_corrupt)
+    except BaseException:
+        DiscardPartial(TempPath)
+        raise
+    os.replace(TempPath, OutputPath)
+
+    if Corrupt:
+        print(f"!!! {len(Corrupt)} of {len(Index)} container blocks could not be recovered: {Corrupt}")
+        return False
+    return True
+
+def ContainerBlocksWriter(f, OutputPath: str, method: str, Index, OriginalSize: int, BlockSize: int,
+                          skip_corrupt: bool = False) -> list[int]:
+    Executor = GetPool().Start() if method in CONTAINER_PARALLEL_PIPELINES and len(Index) > 1 else None
+    Window = deque()
+    Corrupt = []
+
+    with open(OutputPath, 'wb') as f_out:
+        f_out.truncate(OriginalSize)
+
+        def Drain():
+            Number, future = Window.popleft()
+            f_out.seek(Number * BlockSize)
+            f_out.write(future.result())
+
+        for Number, (Offset, PackedLength, RawLength, Checksum) in enumerate(Index):
+            f.seek(Offset)
+            payload = f.read(PackedLength)
+            if zlib.crc32(payload) != Checksum:
+                if not skip_corrupt:
+                    raise ValueError(f"Container block {Number} checksum mismatch")
+                print(f"!!! Warning: container block {Number} is corrupt, leaving {RawLength} bytes zero-filled")
+                Corrupt.append(Number)
+                continue
+            if Executor is None:
+                f_out.seek(Number * BlockSize)
+                f_out.write(DecodeContainerBlock(payload, method, RawLength))
+                continue
+            Window.append((Number, Executor.submit(DecodeContainerBlock, payload, method, RawLength)))
+            if len(Window) >= CONTAINER_INFLIGHT_BLOCKS:
+                Drain()
+        while Window:
+            Drain()
+
+    return Corrupt
+
+def FileDecompressor(InputPath: str, OutputPath: str, skip_corrupt: bool = False) -> bool:
     try:
         if not os.path.isfile(InputPath):
             raise FileNotFoundError(f"Input file does not exist: {InputPath}")
@@ -196,21 +478,21 @@ def FileDecompressor(InputPath: str, OutputPath: str) -> bool:
             if not method:
                 raise ValueError(f"Unknown magic header: {magic}")
 
-            handlers = {
-                'lzw': lambda: HandlerLZW(f),
-                'rle': lambda: HandlerRLE(f),
-                'rle+lzw': lambda: HandlerRLE_then_lzw(f),
-                'tans': lambda: HandlerTANS(f),
-                'rle+tans': lambda: HandlerRLE_ThenTANS(f),
-                'lzw+tans': lambda: HandlerLZW_ThenTANS(f),
-                'rle+lzw+tans': lambda: HandlerRLELZWThenTANS(f),
-            }
+            if method == 'container':
+                return ContainerDecompressor(f, OutputPath, skip_corrupt)
 
-            handler = handlers.get(method)
-            if not handler:
-                raise ValueError(f"Unsupported compression method: {method}")
+            if method in STREAM_HANDLERS:
+                TempPath = PartialPath(OutputPath)
+                try:
+                    with open(TempPath, 'wb') as f_out:
+                        STREAM_HANDLERS[method](f, f_out)
+                except BaseException:
+                    DiscardPartial(TempPath)
+                    raise
+                os.replace(TempPath, OutputPath)
+                return True
 
-            data = handler()
+            data = DecodePipeline(f, method)
 
             if data is None:
                 print(f"!!! Skipping writing output: file {InputPath} is not suitable for {method} decompression.")
@@ -223,4 +505,56 @@ def FileDecompressor(InputPath: str, OutputPath: str) -> bool:
     except Exception as e:
         print(f"Exception during decompression ({InputPath}): {e}")
         traceback.print_exc()
-        return False 
+        return False
+
+def TestMixedData(size: int) -> bytes:
+    Parts = []
+    Length = 0
+    while Length < size:
+        Kind = random.randrange(3)
+        if Kind == 0:
+            Part = bytes([random.getrandbits(8)]) * random.randint(1, 600)
+        elif Kind == 1:
+            Part = bytes(random.getrandbits(8) for _ in range(random.randint(1, 300)))
+        else:
+            Part = random.choice([b"the quick brown fox ", b"lorem ipsum dolor ", b"\x00\xff\x00"]) * random.randint(1, 40)
+        Parts.append(Part)
+        Length += len(Part)
+    return b"".join(Parts)[:size]
+
+def TestRoundTrip():
+    BlockSize = CONTAINER_MIN_BLOCK_SIZE
+    with tempfile.TemporaryDirectory() as TempDir:
+        InputPath, PackedPath, OutputPath = (os.path.join(TempDir, Name) for Name in ("in", "packed", "out"))
+        for TestNum in range(3):
+            data = TestMixedData(random.randint(1, 3 * BlockSize))
+            with open(InputPath, 'wb') as f:
+                f.write(data)
+            for method, magic in MAGIC_HEADERS.items():
+                FileCompressor(InputPath, PackedPath, method, block_size=BlockSize)
+                assert FileDecompressor(PackedPath, OutputPath), f"Test {TestNum} failed: {method} did not decode"
+                with open(OutputPath, 'rb') as f:
+                    assert f.read() == data, f"Test {TestNum} failed: {method} ({magic}) round trip differs"
+            print(f"Test {TestNum} passed: size {len(data)} bytes, {len(MAGIC_HEADERS)} methods")
+
+        data = TestMixedData(3 * BlockSize)
+        with open(InputPath, 'wb') as f:
+            f.write(data)
+        FileCompressor(InputPath, PackedPath, 'rle2', block_size=BlockSize)
+        with open(PackedPath, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            Last = f.read(1)[0]
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([Last ^ 0xFF]))
+        os.remove(OutputPath)
+        assert not FileDecompressor(PackedPath, OutputPath), "Corrupt CTR2 block decoded without skip_corrupt"
+        assert not os.path.exists(OutputPath) and not os.path.exists(PartialPath(OutputPath)), \
+            "Corrupt CTR2 block left output behind"
+        assert not FileDecompressor(PackedPath, OutputPath, skip_corrupt=True), "Corrupt CTR2 block was not reported"
+        with open(OutputPath, 'rb') as f:
+            assert f.read() == data[:2 * BlockSize] + bytes(BlockSize), "skip_corrupt did not zero-fill the corrupt block"
+        print("CRC test passed: corrupt block rejected, and zero-filled with skip_corrupt")
+    print("All tests passed!")
+
+if __name__ == "__main__":
+    TestRoundTrip()
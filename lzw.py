@@ -1,17 +1,185 @@
-from typing import List
-import concurrent.futures
+from typing import List, Tuple
+import os
+import zlib
+from array import array
+from multiprocessing.shared_memory import SharedMemory
 from itertools import islice
+from operator import ge
+from bitio import BitReader, BitWriter, BytesToCodes, CodesToBytes
+from pool import GetPool
 
 DEFAULT_MAX_DICT_SIZE = 1 << 16
-
-from typing import List
-
-def LZW_Compress(data: bytes, max_dict_size: int = DEFAULT_MAX_DICT_SIZE) -> List[int]:
+MIN_CODE_BITS = 9
+DEFAULT_MAX_CODE_BITS = 16
+MAX_CODE_BITS_LIMIT = 20
+CLEAR_CODE = 256
+FIRST_RESET_CODE = 257
+RESET_CHECK_INTERVAL = 1 << 13
+RESET_RATIO_DROP = 0.9
+LZW_RESET_FLAG = 0x80
+LZW_PRESET_FLAG = 0x40
+LZW_CODE_BITS_MASK = 0x1F
+LZW_CHUNK_SIZE = 64 * 1024
+LZW_BYTES_PER_ENTRY = 16
+LZW_PRESET_SIZE = 4096
+LZW_BULK_CODES = 1 << 16
+LZW_STREAM_WINDOW = 1 << 22
+PRESETS_DIR = 'presets'
+LZW_PRESET_ID_MAX = 255
+LZW_PRESET_ID_FORBIDDEN = '/\\:\0'
+
+
+class LZWPreset:
+    def __init__(self, Prefixes: array, Suffixes: bytes, preset_id: str = ''):
+        if len(Prefixes) != len(Suffixes):
+            raise ValueError("Preset prefix and suffix tables differ in length")
+        self.Id = preset_id
+        self.Prefixes = Prefixes
+        self.Suffixes = Suffixes
+        self.ChildrenCache = {}
+        self.PhrasesCache = None
+
+    def __len__(self) -> int:
+        return len(self.Suffixes)
+
+    def __getstate__(self):
+        return {'Id': self.Id, 'Prefixes': self.Prefixes, 'Suffixes': self.Suffixes}
+
+    def __setstate__(self, state):
+        self.__init__(state['Prefixes'], state['Suffixes'], state['Id'])
+
+    def Children(self, first: int) -> dict:
+        Base = self.ChildrenCache.get(first)
+        if Base is None:
+            Base = {}
+            for i, (prefix, Byte) in enumerate(zip(self.Prefixes, self.Suffixes)):
+                if prefix >= 256:
+                    prefix += first - 256
+                Base[(prefix << 8) | Byte] = first + i
+            self.ChildrenCache[first] = Base
+        return dict(Base)
+
+    def Phrases(self) -> List[bytes]:
+        if self.PhrasesCache is None:
+            Phrases = []
+            for prefix, Byte in zip(self.Prefixes, self.Suffixes):
+                Head = bytes([prefix]) if prefix < 256 else Phrases[prefix - 256]
+                Phrases.append(Head + bytes([Byte]))
+            self.PhrasesCache = Phrases
+        return self.PhrasesCache
+
+    def ToBytes(self) -> bytes:
+        return len(self).to_bytes(4, 'big') + CodesToBytes(self.Prefixes, 2) + self.Suffixes
+
+    def Checksum(self) -> int:
+        return zlib.crc32(self.ToBytes())
+
+    @classmethod
+    def FromBytes(cls, data: bytes, preset_id: str = '') -> 'LZWPreset':
+        Count = int.from_bytes(data[:4], 'big')
+        if len(data) != 4 + 3 * Count:
+            raise ValueError(f"Corrupt LZW preset {preset_id!r}: expected {4 + 3 * Count} bytes, got {len(data)}")
+        return cls(BytesToCodes(data[4:4 + 2 * Count], 2), bytes(data[4 + 2 * Count:]), preset_id)
+
+
+def ValPresetId(preset_id: str):
+    Encoded = preset_id.encode('utf-8')
+    if not 0 < len(Encoded) <= LZW_PRESET_ID_MAX:
+        raise ValueError(f"LZW preset id must be 1-{LZW_PRESET_ID_MAX} UTF-8 bytes, got {len(Encoded)}")
+    if any(c in LZW_PRESET_ID_FORBIDDEN for c in preset_id) or preset_id in ('.', '..'):
+        raise ValueError(f"LZW preset id {preset_id!r} must be a plain name without path separators")
+
+
+def PresetFirstCode(first: int, preset: LZWPreset = None) -> int:
+    return first + (len(preset) if preset else 0)
+
+
+def TrainLZWPreset(CorpusDir: str, preset_id: str, max_entries: int = LZW_PRESET_SIZE) -> LZWPreset:
+    ValPresetId(preset_id)
+    Children = {}
+    Parents = []
+    Bytes = bytearray()
+    Hits = []
+
+    for name in sorted(os.listdir(CorpusDir)):
+        path = os.path.join(CorpusDir, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data:
+            continue
+
+        code = data[0]
+        for Byte in memoryview(data)[1:]:
+            Key = (code << 8) | Byte
+            Child = Children.get(Key)
+            if Child is not None:
+                code = Child
+                continue
+            if code >= 256:
+                Hits[code - 256] += 1
+            if len(Parents) < DEFAULT_MAX_DICT_SIZE - 256:
+                Children[Key] = 256 + len(Parents)
+                Parents.append(code)
+                Bytes.append(Byte)
+                Hits.append(0)
+            code = Byte
+        if code >= 256:
+            Hits[code - 256] += 1
+
+    Lengths = []
+    for parent in Parents:
+        Lengths.append(2 if parent < 256 else Lengths[parent - 256] + 1)
+
+    Chosen = set()
+    for index in sorted(range(len(Parents)), key=lambda i: Hits[i] * (Lengths[i] - 1), reverse=True):
+        if not Hits[index]:
+            break
+        Chain = []
+        while index not in Chosen:
+            Chain.append(index)
+            if Parents[index] < 256:
+                break
+            index = Parents[index] - 256
+        if len(Chosen) + len(Chain) > max_entries:
+            continue
+        Chosen.update(Chain)
+
+    Order = sorted(Chosen)
+    Renumber = {old: 256 + new for new, old in enumerate(Order)}
+    Prefixes = array('H', (Parents[i] if Parents[i] < 256 else Renumber[Parents[i] - 256] for i in Order))
+    return LZWPreset(Prefixes, bytes(Bytes[i] for i in Order), preset_id)
+
+
+def SaveLZWPreset(preset: LZWPreset, directory: str = PRESETS_DIR) -> str:
+    ValPresetId(preset.Id)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{preset.Id}.lzwp")
+    with open(path, 'wb') as f:
+        f.write(preset.ToBytes())
+    return path
+
+
+def LoadLZWPreset(preset_id: str, directory: str = PRESETS_DIR) -> LZWPreset:
+    ValPresetId(preset_id)
+    path = os.path.join(directory, f"{preset_id}.lzwp")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"LZW preset dictionary {preset_id!r} not found at {path}")
+    with open(path, 'rb') as f:
+        return LZWPreset.FromBytes(f.read(), preset_id)
+
+
+def LZW_Compress(data: bytes, max_dict_size: int = DEFAULT_MAX_DICT_SIZE, preset: LZWPreset = None) -> List[int]:
     if not data:
         return []
 
     Dictionary = {bytes([i]): i for i in range(256)}
     CodeNext = 256
+    if preset:
+        for Phrase in preset.Phrases():
+            Dictionary[Phrase] = CodeNext
+            CodeNext += 1
     word = b""
     result = []
 
@@ -32,20 +200,115 @@ def LZW_Compress(data: bytes, max_dict_size: int = DEFAULT_MAX_DICT_SIZE) -> Lis
     return result
 
 
-def LZW_Decompress(codes: List[int], max_dict_size: int = DEFAULT_MAX_DICT_SIZE) -> bytes:
+def LZW_CompressTrie(data: bytes, max_dict_size: int = DEFAULT_MAX_DICT_SIZE, preset: LZWPreset = None) -> List[int]:
+    if not data:
+        return []
+
+    Children = preset.Children(256) if preset else {}
+    CodeNext = PresetFirstCode(256, preset)
+    code = data[0]
+    result = []
+    append = result.append
+
+    for Byte in memoryview(data)[1:]:
+        Key = (code << 8) | Byte
+        Child = Children.get(Key)
+        if Child is not None:
+            code = Child
+        else:
+            append(code)
+            if CodeNext < max_dict_size:
+                Children[Key] = CodeNext
+                CodeNext += 1
+            code = Byte
+
+    append(code)
+    return result
+
+
+def LZW_CompressAdaptive(data: bytes, max_dict_size: int = DEFAULT_MAX_DICT_SIZE,
+                        check_interval: int = RESET_CHECK_INTERVAL, preset: LZWPreset = None) -> List[int]:
+    if not data:
+        return []
+
+    First = PresetFirstCode(FIRST_RESET_CODE, preset)
+    Children = preset.Children(FIRST_RESET_CODE) if preset else {}
+    CodeNext = First
+    code = data[0]
+    result = []
+    append = result.append
+    WindowStart = 0
+    WindowCodes = 0
+    BestRatio = 0.0
+
+    for Pos, Byte in enumerate(memoryview(data)[1:], 1):
+        Key = (code << 8) | Byte
+        Child = Children.get(Key)
+        if Child is not None:
+            code = Child
+            continue
+
+        append(code)
+        code = Byte
+        if CodeNext < max_dict_size:
+            Children[Key] = CodeNext
+            CodeNext += 1
+            WindowStart = Pos
+            continue
+
+        WindowCodes += 1
+        if Pos - WindowStart >= check_interval:
+            Ratio = (Pos - WindowStart) / WindowCodes
+            if Ratio < BestRatio * RESET_RATIO_DROP:
+                append(CLEAR_CODE)
+                Children = preset.Children(FIRST_RESET_CODE) if preset else {}
+                CodeNext = First
+                BestRatio = 0.0
+            else:
+                BestRatio = max(BestRatio, Ratio)
+            WindowStart = Pos
+            WindowCodes = 0
+
+    append(code)
+    return result
+
+
+LZW_ENCODERS = {
+    'bytes': LZW_Compress,
+    'trie': LZW_CompressTrie,
+}
+
+
+def LZW_Decompress(codes: List[int], max_dict_size: int = DEFAULT_MAX_DICT_SIZE, reset: bool = False,
+                   preset: LZWPreset = None) -> bytes:
     if not codes:
         return b""
 
-    Dictionary = {i: bytes([i]) for i in range(256)}
-    CodeNext = 256
+    Base = FIRST_RESET_CODE if reset else 256
+    First = PresetFirstCode(Base, preset)
+    Initial = {i: bytes([i]) for i in range(256)}
+    if preset:
+        Initial.update(zip(range(Base, First), preset.Phrases()))
+    Dictionary = dict(Initial)
+    CodeNext = First
 
     result = bytearray()
-    word = Dictionary.get(codes[0])
-    if word is None:
-        raise ValueError(f"Invalid first LZW code: {codes[0]}")
-    result.extend(word)
+    word = None
+
+    for code in codes:
+        if reset and code == CLEAR_CODE:
+            Dictionary = dict(Initial)
+            CodeNext = First
+            word = None
+            continue
+
+        if word is None:
+            word = Dictionary.get(code)
+            if word is None:
+                raise ValueError(f"Invalid first LZW code: {code}")
+            result.extend(word)
+            continue
 
-    for code in codes[1:]:
         if code in Dictionary:
             entry = Dictionary[code]
         elif code == CodeNext:
@@ -64,32 +327,241 @@ def LZW_Decompress(codes: List[int], max_dict_size: int = DEFAULT_MAX_DICT_SIZE)
     return bytes(result)
 
 
+def LZW_DecompressBuffer(codes: List[int], max_dict_size: int = DEFAULT_MAX_DICT_SIZE, reset: bool = False,
+                         output_size: int = None, preset: LZWPreset = None) -> bytes:
+    if not codes:
+        return b""
+
+    Base = FIRST_RESET_CODE if reset else 256
+    First = PresetFirstCode(Base, preset)
+    Offset = array('Q', [0]) * max_dict_size
+    Length = array('Q', [1]) * max_dict_size
+    Out = bytearray()
+    if preset:
+        for code, Phrase in enumerate(preset.Phrases(), Base):
+            Offset[code] = len(Out)
+            Length[code] = len(Phrase)
+            Out += Phrase
+    Start = Pos = len(Out)
+    Out.extend(bytes(output_size or 4 * len(codes)))
+    CodeNext = First
+    PrevPos = -1
+    PrevLen = 0
+
+    for code in codes:
+        if reset and code == CLEAR_CODE:
+            CodeNext = First
+            PrevPos = -1
+            continue
+
+        if code < 256:
+            PhraseLen = 1
+            if Pos >= len(Out):
+                Out.extend(bytes(len(Out)))
+            Out[Pos] = code
+        elif code < CodeNext and (PrevPos >= 0 or code < First):
+            PhraseLen = Length[code]
+            Source = Offset[code]
+            if Pos + PhraseLen > len(Out):
+                Out.extend(bytes(max(len(Out), PhraseLen)))
+            Out[Pos:Pos + PhraseLen] = Out[Source:Source + PhraseLen]
+        elif code == CodeNext and PrevPos >= 0:
+            PhraseLen = PrevLen + 1
+            if Pos + PhraseLen > len(Out):
+                Out.extend(bytes(max(len(Out), PhraseLen)))
+            Out[Pos:Pos + PrevLen] = Out[PrevPos:PrevPos + PrevLen]
+            Out[Pos + PrevLen] = Out[PrevPos]
+        else:
+            raise ValueError(f"Invalid LZW code: {code}")
+
+        if PrevPos >= 0 and CodeNext < max_dict_size:
+            Offset[CodeNext] = PrevPos
+            Length[CodeNext] = PrevLen + 1
+            CodeNext += 1
+
+        PrevPos = Pos
+        PrevLen = PhraseLen
+        Pos += PhraseLen
+
+    return bytes(Out[Start:Pos])
+
+
 def BytesToCodesEncoder(codes: List[int]) -> bytes:
-    return b''.join(code.to_bytes(2, 'big') for code in codes)
+    return CodesToBytes(codes, 2)
 
 
-def BytesToCodesDecoder(data: bytes) -> List[int]:
+def BytesToCodesDecoder(data: bytes) -> array:
     if len(data) % 2 != 0:
         raise ValueError(f"Expected even number of bytes, got {len(data)}")
-    return [int.from_bytes(data[i:i + 2], 'big') for i in range(0, len(data), 2)]
+    return BytesToCodes(data, 2)
+
+
+def StartCodeWidth(avail: int) -> int:
+    return max(MIN_CODE_BITS, (avail - 1).bit_length())
+
+
+def CodesToVarWidthBytes(codes: List[int], max_bits: int = DEFAULT_MAX_CODE_BITS, reset: bool = False,
+                         preset_size: int = 0) -> bytes:
+    Writer = BitWriter()
+    Limit = 1 << max_bits
+    First = (FIRST_RESET_CODE if reset else 256) + preset_size
+    Width = StartCodeWidth(First)
+    Avail = First
+    Pos = 0
+
+    while Pos < len(codes):
+        End = len(codes) if Avail >= Limit else min(len(codes), Pos + (1 << Width) - Avail + 1)
+        Cleared = False
+        if reset:
+            try:
+                End = codes.index(CLEAR_CODE, Pos, End) + 1
+                Cleared = True
+            except ValueError:
+                pass
+        Segment = codes[Pos:End]
+        if any(map(ge, Segment, range(Avail, Avail + len(Segment)))) if Avail < Limit else max(Segment) >= Limit:
+            raise ValueError(f"LZW code not representable at dictionary size {Avail}")
+        Writer.WriteMany(Segment, Width)
+        if Cleared:
+            Width = StartCodeWidth(First)
+            Avail = First
+        else:
+            Avail = min(Limit, Avail + len(Segment))
+            if Avail > (1 << Width):
+                Width += 1
+        Pos = End
+
+    return Writer.Flush()
+
+
+def VarWidthBytesToCodes(data: bytes, max_bits: int = DEFAULT_MAX_CODE_BITS, reset: bool = False,
+                         preset_size: int = 0) -> List[int]:
+    Reader = BitReader(data)
+    Limit = 1 << max_bits
+    First = (FIRST_RESET_CODE if reset else 256) + preset_size
+    Width = StartCodeWidth(First)
+    Avail = First
+    codes = []
+
+    while Reader.Remaining() >= Width:
+        Count = min(LZW_BULK_CODES, Reader.Remaining() // Width)
+        if Avail < Limit:
+            Count = min(Count, (1 << Width) - Avail + 1)
+        Start = Reader.Tell()
+        Segment = Reader.ReadMany(Count, Width)
+        if reset and CLEAR_CODE in Segment:
+            Count = Segment.index(CLEAR_CODE) + 1
+            del Segment[Count:]
+            Reader.Seek(Start + Count * Width)
+            codes += Segment
+            Width = StartCodeWidth(First)
+            Avail = First
+            continue
+        codes += Segment
+        Avail = min(Limit, Avail + Count)
+        if Avail > (1 << Width):
+            Width += 1
+
+    return codes
 
 
 def ChunkCompressor(data: bytes) -> List[int]:
-    return LZW_Compress(data)
+    return LZW_CompressTrie(data)
 
 
 def ChunkDecompressor(codes: List[int]) -> bytes:
-    return LZW_Decompress(codes)
+    return LZW_DecompressBuffer(codes)
+
+
+def ValMaxCodeBits(max_bits: int, preset: LZWPreset = None):
+    if not MIN_CODE_BITS <= max_bits <= MAX_CODE_BITS_LIMIT:
+        raise ValueError(f"LZW max code width must be between {MIN_CODE_BITS} and {MAX_CODE_BITS_LIMIT} bits, got {max_bits}")
+    if preset and PresetFirstCode(FIRST_RESET_CODE, preset) >= 1 << max_bits:
+        raise ValueError(f"LZW preset {preset.Id!r} with {len(preset)} entries does not fit in {max_bits}-bit codes")
+
+
+def LZWChunkSize(chunk_size: int, max_bits: int = DEFAULT_MAX_CODE_BITS, fill: bool = False) -> int:
+    if chunk_size <= 0:
+        raise ValueError(f"LZW chunk size must be positive, got {chunk_size}")
+    if fill or max_bits > DEFAULT_MAX_CODE_BITS:
+        return max(chunk_size, LZW_BYTES_PER_ENTRY << max_bits)
+    return chunk_size
+
+
+def ChunkCompressorPacked(data: bytes, max_bits: int = DEFAULT_MAX_CODE_BITS, reset: bool = False,
+                          preset: LZWPreset = None) -> bytes:
+    ValMaxCodeBits(max_bits, preset)
+    if reset:
+        codes = LZW_CompressAdaptive(data, 1 << max_bits, preset=preset)
+    else:
+        codes = LZW_CompressTrie(data, 1 << max_bits, preset)
+    return CodesToVarWidthBytes(codes, max_bits, reset, len(preset) if preset else 0)
+
+
+def ChunkDecompressorPacked(packed: bytes, max_bits: int = DEFAULT_MAX_CODE_BITS, reset: bool = False,
+                            preset: LZWPreset = None) -> bytes:
+    ValMaxCodeBits(max_bits, preset)
+    codes = VarWidthBytesToCodes(packed, max_bits, reset, len(preset) if preset else 0)
+    return LZW_DecompressBuffer(codes, 1 << max_bits, reset, preset=preset)
 
 
-def LZWParallel(data: bytes, chunk_size=64 * 1024, max_workers=None) -> List[int]:
-    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+def SharedChunkCompressor(name: str, start: int, end: int, max_bits: int, reset: bool,
+                          preset: LZWPreset = None) -> bytes:
+    shm = SharedMemory(name=name)
+    try:
+        return ChunkCompressorPacked(shm.buf[start:end], max_bits, reset, preset)
+    finally:
+        shm.close()
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-        CompressedChunks = list(executor.map(ChunkCompressor, chunks))
+
+def SharedChunkCodes(name: str, start: int, end: int, encoder: str) -> array:
+    shm = SharedMemory(name=name)
+    try:
+        return array('H', LZW_ENCODERS[encoder](shm.buf[start:end]))
+    finally:
+        shm.close()
+
+
+def SharedChunkDecompressorInto(name: str, start: int, end: int, out_name: str, out_start: int, out_len: int,
+                                max_bits: int, reset: bool, preset: LZWPreset = None):
+    shm = SharedMemory(name=name)
+    out = SharedMemory(name=out_name)
+    try:
+        codes = VarWidthBytesToCodes(bytes(shm.buf[start:end]), max_bits, reset, len(preset) if preset else 0)
+        Decoded = LZW_DecompressBuffer(codes, 1 << max_bits, reset, out_len, preset)
+        if len(Decoded) != out_len:
+            raise ValueError(f"LZW chunk at offset {out_start} decoded to {len(Decoded)} bytes, expected {out_len}")
+        out.buf[out_start:out_start + out_len] = Decoded
+    finally:
+        shm.close()
+        out.close()
+
+
+def LZWParallelChunks(data: bytes, chunk_size=LZW_CHUNK_SIZE, max_workers=None, encoder: str = 'trie') -> List[array]:
+    spans = [(i, min(i + chunk_size, len(data))) for i in range(0, len(data), chunk_size)]
+    return GetPool(max_workers).MapShared(data, spans, SharedChunkCodes, encoder)
+
+
+def LZWParallelPacked(data: bytes, chunk_size=LZW_CHUNK_SIZE, max_workers=None,
+                      max_bits: int = DEFAULT_MAX_CODE_BITS, reset: bool = False, preset: LZWPreset = None) -> List[bytes]:
+    ValMaxCodeBits(max_bits, preset)
+    spans = [(i, min(i + chunk_size, len(data))) for i in range(0, len(data), chunk_size)]
+    return GetPool(max_workers).MapShared(data, spans, SharedChunkCompressor, max_bits, reset, preset)
+
+
+def ParallelDecompLZWTable(payload: bytes, table: List[Tuple[int, int]], max_bits: int = DEFAULT_MAX_CODE_BITS,
+                           reset: bool = False, preset: LZWPreset = None) -> bytes:
+    ValMaxCodeBits(max_bits, preset)
+    return GetPool().MapInto(payload, table, SharedChunkDecompressorInto, max_bits, reset, preset)
+
+
+def LZWParallel(data: bytes, chunk_size=LZW_CHUNK_SIZE, max_workers=None, encoder: str = 'trie') -> List[int]:
+    CompressedChunks = LZWParallelChunks(data, chunk_size, max_workers, encoder)
 
     result = []
     for c in CompressedChunks:
+        if len(c) > 0xFFFF:
+            raise ValueError(f"LZW chunk produced {len(c)} codes; the count-prefixed stream holds at most 65535 per chunk")
         result.append(len(c))  
         result.extend(c)
 
@@ -108,10 +580,7 @@ def ParallelDecompLZW(codes: List[int]) -> bytes:
         except StopIteration:
             break
 
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        DeCompressedChunks = list(executor.map(ChunkDecompressor, chunks))
-
-    return b"".join(DeCompressedChunks)
+    return b"".join(GetPool().Map(ChunkDecompressor, chunks))
 
 
 def LZWDecompressFromBytes(data: bytes) -> bytes:
@@ -119,11 +588,215 @@ def LZWDecompressFromBytes(data: bytes) -> bytes:
     if len(data) % 2 != 0:
         raise ValueError("Invalid data length for 16-bit codes")
 
-    codes = [int.from_bytes(data[i:i+2], 'big') for i in range(0, len(data), 2)]
+    codes = BytesToCodes(data, 2)
 
     MaxCode = 4095 
-    if any(code > MaxCode for code in codes):
+    if codes and max(codes) > MaxCode:
         print("Warning: LZW codes exceed max expected code")
 
-    return LZW_Decompress(codes)
-
+    return LZW_DecompressBuffer(codes)
+
+
+
+class LZWEncoder:
+    def __init__(self, max_bits: int = DEFAULT_MAX_CODE_BITS, reset: bool = False,
+                 check_interval: int = RESET_CHECK_INTERVAL):
+        ValMaxCodeBits(max_bits)
+        self.MaxBits = max_bits
+        self.Reset = reset
+        self.CheckInterval = check_interval
+        self.MaxDictSize = 1 << max_bits
+        self.First = FIRST_RESET_CODE if reset else 256
+        self.Children = {}
+        self.CodeNext = self.First
+        self.Code = None
+        self.Writer = BitWriter()
+        self.Width = MIN_CODE_BITS
+        self.Avail = self.First
+        self.Pos = 0
+        self.WindowStart = 0
+        self.WindowCodes = 0
+        self.BestRatio = 0.0
+
+    def Emit(self, code: int):
+        self.Writer.Write(code, self.Width)
+        if self.Reset and code == CLEAR_CODE:
+            self.Width = MIN_CODE_BITS
+            self.Avail = self.First
+        elif self.Avail < self.MaxDictSize:
+            self.Avail += 1
+            if self.Avail > (1 << self.Width):
+                self.Width += 1
+
+    def Feed(self, chunk: bytes) -> bytes:
+        if not chunk:
+            return b""
+
+        view = memoryview(chunk)
+        if self.Code is None:
+            self.Code = view[0]
+            view = view[1:]
+            self.Pos += 1
+
+        Children = self.Children
+        Emit = self.Emit
+        code = self.Code
+        for Pos, Byte in enumerate(view, self.Pos):
+            Key = (code << 8) | Byte
+            Child = Children.get(Key)
+            if Child is not None:
+                code = Child
+                continue
+
+            Emit(code)
+            code = Byte
+            if self.CodeNext < self.MaxDictSize:
+                Children[Key] = self.CodeNext
+                self.CodeNext += 1
+                self.WindowStart = Pos
+                continue
+
+            if not self.Reset:
+                continue
+            self.WindowCodes += 1
+            if Pos - self.WindowStart >= self.CheckInterval:
+                Ratio = (Pos - self.WindowStart) / self.WindowCodes
+                if Ratio < self.BestRatio * RESET_RATIO_DROP:
+                    Emit(CLEAR_CODE)
+                    Children.clear()
+                    self.CodeNext = self.First
+                    self.BestRatio = 0.0
+                else:
+                    self.BestRatio = max(self.BestRatio, Ratio)
+                self.WindowStart = Pos
+                self.WindowCodes = 0
+
+        self.Code = code
+        self.Pos += len(view)
+        return self.Writer.Take()
+
+    def Flush(self) -> bytes:
+        if self.Code is not None:
+            self.Emit(self.Code)
+            self.Code = None
+        return self.Writer.Flush()
+
+
+class LZWDecoder:
+    def __init__(self, max_bits: int = DEFAULT_MAX_CODE_BITS, reset: bool = False, window: int = LZW_STREAM_WINDOW):
+        ValMaxCodeBits(max_bits)
+        self.Reset = reset
+        self.MaxDictSize = 1 << max_bits
+        self.First = FIRST_RESET_CODE if reset else 256
+        self.Prefix = array('l', [0]) * self.MaxDictSize
+        self.Suffix = bytearray(range(256)) + bytes(self.MaxDictSize - 256)
+        self.Length = array('l', [1]) * self.MaxDictSize
+        self.Offset = array('q', [-1]) * self.MaxDictSize
+        self.NextCode = self.First
+        self.Prev = None
+        self.PrevPos = 0
+        self.Window = bytearray()
+        self.WindowStart = 0
+        self.WindowSize = window
+        self.Width = MIN_CODE_BITS
+        self.Avail = self.First
+        self.Reader = BitReader()
+
+    def WritePhrase(self, code: int) -> int:
+        Window = self.Window
+        Offset = self.Offset
+        Pos = self.WindowStart + len(Window)
+        if code < 256:
+            Window.append(code)
+            return Pos
+
+        Start = Offset[code] - self.WindowStart
+        if Start < 0:
+            Tail = bytearray()
+            Prefix = self.Prefix
+            Suffix = self.Suffix
+            while code >= 256 and Offset[code] < self.WindowStart:
+                Tail.append(Suffix[code])
+                Offset[code] = Pos
+                code = Prefix[code]
+            if code < 256:
+                Window.append(code)
+            else:
+                Start = Offset[code] - self.WindowStart
+                Window += Window[Start:Start + self.Length[code]]
+                Offset[code] = Pos
+            Tail.reverse()
+            Window += Tail
+        else:
+            Window += Window[Start:Start + self.Length[code]]
+            Offset[code] = Pos
+        return Pos
+
+    def Feed(self, chunk: bytes) -> bytes:
+        Reader = self.Reader
+        Reader.Feed(chunk)
+        read = Reader.Read
+        Window = self.Window
+        Base = self.WindowStart
+        Prefix, Suffix, Length, Offset = self.Prefix, self.Suffix, self.Length, self.Offset
+        First, MaxDictSize, Reset = self.First, self.MaxDictSize, self.Reset
+        Prev, PrevPos, NextCode = self.Prev, self.PrevPos, self.NextCode
+        Width, Avail = self.Width, self.Avail
+        Emitted = len(Window)
+
+        while Reader.Remaining() >= Width:
+            code = read(Width)
+
+            if Reset and code == CLEAR_CODE:
+                NextCode = First
+                Prev = None
+                Width = MIN_CODE_BITS
+                Avail = First
+                continue
+
+            if Avail < MaxDictSize:
+                Avail += 1
+                if Avail > (1 << Width):
+                    Width += 1
+
+            Pos = Base + len(Window)
+            if code < 256:
+                Window.append(code)
+            elif Prev is None:
+                raise ValueError(f"Invalid first LZW code: {code}")
+            elif First <= code < NextCode:
+                Start = Offset[code] - Base
+                if Start >= 0:
+                    Window += Window[Start:Start + Length[code]]
+                    Offset[code] = Pos
+                else:
+                    self.WritePhrase(code)
+            elif code == NextCode:
+                self.WritePhrase(Prev)
+                Window.append(Window[Pos - Base])
+            else:
+                raise ValueError(f"Invalid LZW code: {code}")
+
+            if Prev is not None and NextCode < MaxDictSize:
+                Prefix[NextCode] = Prev
+                Suffix[NextCode] = Window[Pos - Base]
+                Length[NextCode] = Length[Prev] + 1
+                Offset[NextCode] = PrevPos
+                NextCode += 1
+            Prev = code
+            PrevPos = Pos
+
+        self.Prev, self.PrevPos, self.NextCode = Prev, PrevPos, NextCode
+        self.Width, self.Avail = Width, Avail
+        out = bytes(Window[Emitted:])
+        Excess = len(Window) - self.WindowSize
+        if Excess > 0:
+            del Window[:Excess]
+            self.WindowStart += Excess
+        return out
+
+    def Flush(self) -> bytes:
+        Trailing = self.Reader.Remaining()
+        if Trailing >= 8 or self.Reader.Read(Trailing):
+            raise ValueError(f"Truncated LZW stream: {Trailing} trailing bits")
+        return b""
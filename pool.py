@@ -0,0 +1,95 @@
+import atexit
+import concurrent.futures
+import multiprocessing
+import os
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Tuple
+
+
+class SerialExecutor(concurrent.futures.Executor):
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class WorkerPool:
+    def __init__(self, max_workers: int):
+        self.MaxWorkers = max_workers
+        self.Executor = None
+
+    def Start(self) -> concurrent.futures.Executor:
+        if self.Executor is None:
+            if self.MaxWorkers <= 1:
+                self.Executor = SerialExecutor()
+            else:
+                resource_tracker.ensure_running()
+                self.Executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.MaxWorkers)
+        return self.Executor
+
+    def Shutdown(self):
+        if self.Executor is not None:
+            self.Executor.shutdown()
+            self.Executor = None
+
+    def MapShared(self, data: bytes, spans, worker, *args) -> list:
+        if not spans:
+            return []
+        Executor = self.Start()
+        shm = SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            shm.buf[:len(data)] = data
+            futures = [Executor.submit(worker, shm.name, start, end, *args) for start, end in spans]
+            return [future.result() for future in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def MapInto(self, payload: bytes, table: List[Tuple[int, int]], worker, *args) -> bytes:
+        if not table:
+            return b""
+        Executor = self.Start()
+        RawTotal = sum(RawLen for _, RawLen in table)
+        src = SharedMemory(create=True, size=max(1, len(payload)))
+        dst = SharedMemory(create=True, size=max(1, RawTotal))
+        try:
+            src.buf[:len(payload)] = payload
+            futures = []
+            InPos = OutPos = 0
+            for PackedLen, RawLen in table:
+                futures.append(Executor.submit(worker, src.name, InPos, InPos + PackedLen,
+                                               dst.name, OutPos, RawLen, *args))
+                InPos += PackedLen
+                OutPos += RawLen
+            for future in futures:
+                future.result()
+            return bytes(dst.buf[:RawTotal])
+        finally:
+            for shm in (src, dst):
+                shm.close()
+                shm.unlink()
+
+    def Map(self, fn, items) -> list:
+        return list(self.Start().map(fn, items))
+
+
+def PoolWorkers(max_workers=None) -> int:
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return max(1, max_workers or os.cpu_count() or 1)
+
+
+WORKER_POOLS = {}
+
+
+def GetPool(max_workers=None) -> WorkerPool:
+    max_workers = PoolWorkers(max_workers)
+    pool = WORKER_POOLS.get(max_workers)
+    if pool is None:
+        pool = WORKER_POOLS[max_workers] = WorkerPool(max_workers)
+        atexit.register(pool.Shutdown)
+    return pool
@@ -1,4 +1,16 @@
 import random
+import re
+from itertools import chain
+from operator import methodcaller, mul
+from multiprocessing.shared_memory import SharedMemory
+from bitio import VarintBytes, ReadVarint
+from pool import GetPool
+
+RUN_START_PATTERN = re.compile(rb'(.)\1{3}', re.DOTALL)
+RUN_MARKER_PATTERN = re.compile(rb'\x00\xff(.)(.)', re.DOTALL)
+RLE2_MIN_RUN = 4
+RLE_BLOCK_SIZE = 1 << 18
+
 def RLE_Encode(data: bytes) -> bytes:
     Encoded = bytearray()
     i = 0
@@ -30,6 +42,78 @@ def RLE_Encode(data: bytes) -> bytes:
             i += RunLength
     return bytes(Encoded)
 
+def RLE_EncodeBulk(data: bytes) -> bytes:
+    Encoded = bytearray()
+    Pos = 0
+    for Start, End in RunSpans(data):
+        if Start > Pos:
+            Encoded += data[Pos:Start].replace(b'\x00', b'\x00\x00')
+        val = data[Start]
+        Full, Rem = divmod(End - Start, 255)
+        Encoded += bytes((0, 0xFF, val, 255)) * Full
+        if Rem:
+            Encoded += bytes((0, 0xFF, val, Rem))
+        Pos = End
+    Encoded += data[Pos:].replace(b'\x00', b'\x00\x00')
+    return bytes(Encoded)
+
+def RunEnd(data: bytes, Pos: int) -> int:
+    Byte = data[Pos - 1:Pos]
+    while Pos < len(data):
+        Segment = data[Pos:Pos + RLE_BLOCK_SIZE]
+        Rest = Segment.lstrip(Byte)
+        if Rest:
+            return Pos + len(Segment) - len(Rest)
+        Pos += len(Segment)
+    return len(data)
+
+def RunSpans(data: bytes):
+    Match = RUN_START_PATTERN.search(data)
+    while Match:
+        End = RunEnd(data, Match.end())
+        yield Match.start(), End
+        Match = RUN_START_PATTERN.search(data, End)
+
+def RLEBlockSpans(data: bytes, block_size: int = RLE_BLOCK_SIZE) -> list[tuple[int, int]]:
+    spans = []
+    Start = 0
+    while Start < len(data):
+        End = Start + block_size
+        End = RunEnd(data, End) if End < len(data) else len(data)
+        spans.append((Start, End))
+        Start = End
+    return spans
+
+def SharedRLEBlockEncoder(name: str, start: int, end: int) -> bytes:
+    shm = SharedMemory(name=name)
+    try:
+        return RLE_EncodeBulk(bytes(shm.buf[start:end]))
+    finally:
+        shm.close()
+
+def SharedRLEBlockDecoderInto(name: str, start: int, end: int, out_name: str, out_start: int, out_len: int):
+    shm = SharedMemory(name=name)
+    out = SharedMemory(name=out_name)
+    try:
+        Decoded = RLE_DecodeSpans(bytes(shm.buf[start:end]))
+        if len(Decoded) != out_len:
+            raise ValueError(f"RLE block at offset {out_start} decoded to {len(Decoded)} bytes, expected {out_len}")
+        out.buf[out_start:out_start + out_len] = Decoded
+    finally:
+        shm.close()
+        out.close()
+
+def RLEParallelBlocks(data: bytes, block_size: int = RLE_BLOCK_SIZE, max_workers=None) -> tuple[list[bytes], list[int]]:
+    spans = RLEBlockSpans(data, block_size)
+    Blocks = GetPool(max_workers).MapShared(data, spans, SharedRLEBlockEncoder)
+    return Blocks, [End - Start for Start, End in spans]
+
+def RLE_EncodeParallel(data: bytes, block_size: int = RLE_BLOCK_SIZE, max_workers=None) -> bytes:
+    return b''.join(RLEParallelBlocks(data, block_size, max_workers)[0])
+
+def RLEParallelDecode(payload: bytes, table: list[tuple[int, int]], max_workers=None) -> bytes:
+    return GetPool(max_workers).MapInto(payload, table, SharedRLEBlockDecoderInto)
+
 def RLE_Decode(data: bytes) -> bytes:
     Decoded = bytearray()
     i = 0
@@ -62,6 +146,137 @@ def RLE_Decode(data: bytes) -> bytes:
             i += 1
     return bytes(Decoded)
 
+def NextRunMarker(data: bytes, Pos: int) -> int:
+    Marker = data.find(b'\x00\xff', Pos)
+    while Marker >= 0:
+        Zeros = Marker
+        while Zeros > Pos and data[Zeros - 1] == 0:
+            Zeros -= 1
+        if (Marker - Zeros) % 2 == 0:
+            return Marker
+        Marker = data.find(b'\x00\xff', Marker + 1)
+    return len(data)
+
+def LiteralSpanSize(data: bytes, Pos: int, End: int) -> int:
+    Zeros = data.count(b'\x00', Pos, End)
+    if Zeros:
+        Pairs = data.count(b'\x00\x00', Pos, End)
+        if Zeros != 2 * Pairs:
+            if End == len(data) and data[End - 1] == 0 and Zeros == 2 * Pairs + 1:
+                raise ValueError("Truncated escape sequence at the end")
+            Bad = data.find(b'\x00', Pos, End)
+            while Bad >= 0 and data[Bad + 1] == 0:
+                Bad = data.find(b'\x00', Bad + 2, End)
+            Context = data[max(0, Bad-5):Bad+10]
+            print(f"Invalid escape sequence at pos {Bad}: 0x00 0x{data[Bad + 1]:02x}, Context bytes: {bytes(Context).hex()}")
+            raise ValueError(f"Invalid escape sequence: 0x00 0x{data[Bad + 1]:02x}")
+    return End - Pos - Zeros // 2
+
+def SplitRunMarkers(data: bytes):
+    Pieces = RUN_MARKER_PATTERN.split(data)
+    Literals = Pieces[0::3]
+    Joined = b'\xff'.join(Literals)
+    Zeros = Joined.count(b'\x00')
+    if Zeros != 2 * Joined.count(b'\x00\x00'):
+        return None
+    if Zeros:
+        Literals = list(map(methodcaller('replace', b'\x00\x00', b'\x00'), Literals))
+    return Literals, Pieces[1::3], Pieces[2::3]
+
+def RLE_DecodedSize(data: bytes) -> int:
+    Split = SplitRunMarkers(data)
+    if Split is not None:
+        Literals, _, Lengths = Split
+        return sum(map(len, Literals)) + sum(b''.join(Lengths))
+
+    Size = 0
+    Pos = 0
+    n = len(data)
+    while Pos < n:
+        End = NextRunMarker(data, Pos)
+        Size += LiteralSpanSize(data, Pos, End)
+        if End == n:
+            break
+        if End + 3 >= n:
+            raise ValueError("Truncated run Marker at the end")
+        Size += data[End + 3]
+        Pos = End + 4
+    return Size
+
+def RLE_DecodeScan(data: bytes, presize: bool = True) -> bytes:
+    n = len(data)
+    Decoded = bytearray(RLE_DecodedSize(data)) if presize else bytearray()
+    Out = 0
+    Pos = 0
+
+    while Pos < n:
+        End = NextRunMarker(data, Pos)
+        if End > Pos:
+            Literal = data[Pos:End]
+            if LiteralSpanSize(data, Pos, End) != End - Pos:
+                Literal = Literal.replace(b'\x00\x00', b'\x00')
+            Decoded[Out:Out + len(Literal)] = Literal
+            Out += len(Literal)
+        if End == n:
+            break
+
+        if End + 3 >= n:
+            raise ValueError("Truncated run Marker at the end")
+        RunLen = data[End + 3]
+        Decoded[Out:Out + RunLen] = bytes((data[End + 2],)) * RunLen
+        Out += RunLen
+        Pos = End + 4
+
+    return bytes(Decoded)
+
+def RLE_DecodeSpans(data: bytes) -> bytes:
+    Split = SplitRunMarkers(data)
+    if Split is None:
+        return RLE_DecodeScan(data)
+
+    Literals, Values, Lengths = Split
+    Runs = list(map(mul, Values, map(ord, Lengths)))
+    Runs.append(b'')
+    return b''.join(chain.from_iterable(zip(Literals, Runs)))
+
+def RLE2_Encode(data: bytes) -> bytes:
+    Encoded = bytearray()
+    Pos = 0
+    for Start, End in RunSpans(data):
+        if Start > Pos:
+            Encoded += VarintBytes((Start - Pos - 1) << 1)
+            Encoded += data[Pos:Start]
+        Encoded += VarintBytes(((End - Start - RLE2_MIN_RUN) << 1) | 1)
+        Encoded.append(data[Start])
+        Pos = End
+    if Pos < len(data):
+        Encoded += VarintBytes((len(data) - Pos - 1) << 1)
+        Encoded += data[Pos:]
+    return bytes(Encoded)
+
+def RLE2_Decode(data: bytes) -> bytes:
+    Pieces = []
+    Pos = 0
+    n = len(data)
+    while Pos < n:
+        Header = data[Pos]
+        if Header < 0x80:
+            Pos += 1
+        else:
+            Header, Pos = ReadVarint(data, Pos)
+        if Header & 1:
+            if Pos >= n:
+                raise ValueError("Truncated RLE2 run record at the end")
+            Pieces.append(data[Pos:Pos + 1] * ((Header >> 1) + RLE2_MIN_RUN))
+            Pos += 1
+        else:
+            End = Pos + (Header >> 1) + 1
+            if End > n:
+                raise ValueError(f"Truncated RLE2 literal block: expected {End - Pos} bytes, got {n - Pos}")
+            Pieces.append(data[Pos:End])
+            Pos = End
+    return b''.join(Pieces)
+
 def Val_RLE_Encoded(data: bytes):
     i = 0
     n = len(data)
@@ -88,6 +303,10 @@ def TestRLERoundTrip():
         Encoded = RLE_Encode(data)
         Decoded = RLE_Decode(Encoded)
         assert Decoded == data, f"Test {TestNum} failed: Decoded data does not match original"
+        assert RLE_EncodeBulk(data) == Encoded, f"Test {TestNum} failed: bulk encoder output differs"
+        assert RLE_DecodeSpans(Encoded) == data, f"Test {TestNum} failed: span decoder output differs"
+        assert RLE_DecodeScan(Encoded) == data, f"Test {TestNum} failed: scan decoder output differs"
+        assert RLE2_Decode(RLE2_Encode(data)) == data, f"Test {TestNum} failed: RLE2 round trip differs"
         print(f"Test {TestNum} passed: size {size} bytes, Encoded size {len(Encoded)} bytes")
     print("All tests passed!")
 if __name__ == "__main__":
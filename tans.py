@@ -1,5 +1,112 @@
-from collections import Counter
+import math
+from collections import Counter, OrderedDict
 from typing import Dict, List, Tuple
+from array import array
+from bitio import REVERSE_BLOCK_BITS, ReverseBitWriter, ReverseBitReader
+
+TANS_MIN_TABLE_LOG = 11
+TANS_MAX_TABLE_LOG = 15
+TANS_DEFAULT_TABLE_LOG = 12
+TANS_TABLE_LOG_MASK = 0x0F
+TANS_COMPACT_FLAG = 0x80
+TANS_BLOCK_SIZE = 128 * 1024
+TANS_TABLE_CACHE_SIZE = 64
+TANS_CONTEXT_MIN_GAIN = 256
+TANS_BUCKET_MANTISSA_BITS = 2
+TANS_BUCKET_CODE_BITS = 16
+TANS_ESTIMATE_SAMPLE = 1 << 16
+TANS_ESTIMATE_WINDOW = 1 << 10
+CODING_STORED = 0
+CODING_RLE = 1
+CODING_TANS = 2
+
+def ValTableLog(TableLog: int):
+    if not TANS_MIN_TABLE_LOG <= TableLog <= TANS_MAX_TABLE_LOG:
+        raise ValueError(f"Table log must be between {TANS_MIN_TABLE_LOG} and {TANS_MAX_TABLE_LOG}, got {TableLog}")
+
+def NormalizeFrequencies(FreqTable: Dict[int, int], TableSize: int) -> Dict[int, int]:
+    if len(FreqTable) > TableSize:
+        raise ValueError(f"{len(FreqTable)} symbols do not fit a table of size {TableSize}")
+    total_norm = sum(FreqTable.values())
+    Norm = {}
+    Remainders = {}
+    for Sym, Freq in FreqTable.items():
+        Norm[Sym], Remainders[Sym] = divmod(Freq * TableSize, total_norm)
+        if Norm[Sym] == 0:
+            Norm[Sym] = 1
+            Remainders[Sym] = -1
+
+    diff = TableSize - sum(Norm.values())
+    if diff > 0:
+        for Sym in sorted(Remainders, key=Remainders.get, reverse=True)[:diff]:
+            Norm[Sym] += 1
+    elif diff < 0:
+        Excess = -diff
+        Removable = TableSize + Excess - len(Norm)
+        for Sym in sorted(Norm, key=Norm.get, reverse=True):
+            Take = min(Excess, -(diff * (Norm[Sym] - 1) // Removable))
+            Norm[Sym] -= Take
+            Excess -= Take
+            if Excess == 0:
+                break
+    return Norm
+
+def CodedBits(FreqTable: Dict[int, int], Counts: Dict[int, int], TableLog: int) -> float:
+    if any(Sym not in Counts for Sym in FreqTable):
+        return math.inf
+    return sum(Freq * (TableLog - math.log2(Counts[Sym])) for Sym, Freq in FreqTable.items())
+
+def SampledCodedBits(FreqTable: Dict[int, int], Counts: Dict[int, int], TableLog: int, Scale: float) -> float:
+    Bias = (len(FreqTable) - 1) / (2 * math.log(2)) if Scale > 1 else 0
+    return (CodedBits(FreqTable, Counts, TableLog) + Bias) * Scale
+
+def EntropySample(data: bytes, sample_size: int = TANS_ESTIMATE_SAMPLE) -> bytes:
+    if len(data) <= sample_size:
+        return data
+    Windows = sample_size // TANS_ESTIMATE_WINDOW
+    Stride = (len(data) - TANS_ESTIMATE_WINDOW) // (Windows - 1)
+    return b"".join(data[i * Stride:i * Stride + TANS_ESTIMATE_WINDOW] for i in range(Windows))
+
+SPREAD_ORDERS = {}
+STATE_TRANSITIONS = {}
+
+def SpreadOrder(TableLog: int) -> List[int]:
+    Order = SPREAD_ORDERS.get(TableLog)
+    if Order is None:
+        TableSize = 1 << TableLog
+        Step = (TableSize >> 1) + (TableSize >> 3) + 3
+        Order = SPREAD_ORDERS[TableLog] = [(k * Step) & (TableSize - 1) for k in range(TableSize)]
+    return Order
+
+def StateTransitions(TableLog: int) -> Tuple[List[int], List[int]]:
+    Transitions = STATE_TRANSITIONS.get(TableLog)
+    if Transitions is None:
+        TableSize = 1 << TableLog
+        NbBits = [TableLog - (x.bit_length() - 1) for x in range(2 * TableSize)]
+        Baselines = [(x << NbBits[x]) - TableSize for x in range(2 * TableSize)]
+        Transitions = STATE_TRANSITIONS[TableLog] = (NbBits, Baselines)
+    return Transitions
+
+BUCKET_TABLES = []
+
+def BucketTables() -> Tuple[List[int], List[int], List[int]]:
+    if not BUCKET_TABLES:
+        Mantissa = TANS_BUCKET_MANTISSA_BITS
+        Direct = 1 << (Mantissa + 1)
+        ExtraBits = [0] * Direct
+        Bases = list(range(Direct))
+        for Width in range(Mantissa + 2, TANS_BUCKET_CODE_BITS + 1):
+            for Top in range(1 << Mantissa):
+                ExtraBits.append(Width - 1 - Mantissa)
+                Bases.append(((1 << Mantissa) | Top) << (Width - 1 - Mantissa))
+        BucketOf = []
+        for Sym in range(len(Bases)):
+            BucketOf += [Sym] * (1 << ExtraBits[Sym])
+        BUCKET_TABLES.extend((BucketOf, ExtraBits, Bases))
+    return tuple(BUCKET_TABLES)
+
+def CodeBuckets(codes) -> bytes:
+    return bytes(map(BucketTables()[0].__getitem__, codes))
 
 class TANS:
     def __init__(self, FreqTable: Dict[int, int], TableSize=65536):
@@ -15,23 +122,7 @@ class TANS:
         self.Symbol_start = {Sym: start for Sym, start in self.TotalFreq.items()}
 
     def Normalize(self, FreqTable):
-        total_norm = sum(FreqTable.values())
-        scale = self.TableSize / total_norm
-        Norm = {Sym: max(1, int(Freq * scale)) for Sym, Freq in FreqTable.items()}
-
-        diff = self.TableSize - sum(Norm.values())
-        Syms = sorted(Norm, key=lambda s: FreqTable[s], reverse=True)
-        i = 0
-        while diff != 0:
-            Sym = Syms[i % len(Syms)]
-            if diff > 0:
-                Norm[Sym] += 1
-                diff -= 1
-            elif Norm[Sym] > 1:
-                Norm[Sym] -= 1
-                diff += 1
-            i += 1
-        return Norm
+        return NormalizeFrequencies(FreqTable, self.TableSize)
 
     def Total_Freq(self):
         Total_Freq_Arr = {}
@@ -82,3 +173,265 @@ class TANS:
             state = Freq * (state - start) + r
         return data
 
+
+
+class TANSCodec:
+    def __init__(self, FreqTable: Dict[int, int], TableLog: int = TANS_DEFAULT_TABLE_LOG, normalized: bool = False):
+        if not FreqTable:
+            raise ValueError("Empty Freq Table")
+        ValTableLog(TableLog)
+
+        self.TableLog = TableLog
+        self.TableSize = 1 << TableLog
+        self.Counts = dict(FreqTable) if normalized else NormalizeFrequencies(FreqTable, self.TableSize)
+        if sum(self.Counts.values()) != self.TableSize or min(self.Counts.values()) < 1:
+            raise ValueError(f"Normalized counts must be positive and sum to {self.TableSize}")
+        self.BuildTables()
+
+    def BuildTables(self):
+        TableLog = self.TableLog
+        TableSize = self.TableSize
+        Order = SpreadOrder(TableLog)
+        NbBits, Baselines = StateTransitions(TableLog)
+        Alphabet = max(self.Counts) + 1
+
+        self.DeltaNbBits = [0] * Alphabet
+        self.DeltaFind = [0] * Alphabet
+        self.EncodeTable = [0] * TableSize
+        self.DecodeTable = [None] * TableSize
+        Total = 0
+        for Sym in sorted(self.Counts):
+            Count = self.Counts[Sym]
+            MaxBits = TableLog - (Count.bit_length() - 1)
+            self.DeltaNbBits[Sym] = (MaxBits << TableLog) - (Count << MaxBits)
+            self.DeltaFind[Sym] = Total - Count
+
+            Positions = sorted(Order[Total:Total + Count])
+            self.EncodeTable[Total:Total + Count] = [TableSize + u for u in Positions]
+            for u, nbBits, Baseline in zip(Positions, NbBits[Count:2 * Count], Baselines[Count:2 * Count]):
+                self.DecodeTable[u] = (Sym, nbBits, Baseline)
+            Total += Count
+
+    def Encode(self, data) -> Tuple[int, int, bytes]:
+        TableLog = self.TableLog
+        DeltaNbBits = self.DeltaNbBits
+        DeltaFind = self.DeltaFind
+        EncodeTable = self.EncodeTable
+        state = self.TableSize
+        Writer = ReverseBitWriter()
+        Spill = Writer.Spill
+        Acc = 0
+        Count = 0
+
+        for Sym in reversed(data):
+            nbBits = (state + DeltaNbBits[Sym]) >> TableLog
+            Acc |= (state & ((1 << nbBits) - 1)) << Count
+            Count += nbBits
+            if Count >= REVERSE_BLOCK_BITS:
+                Acc, Count = Spill(Acc, Count)
+            state = EncodeTable[(state >> nbBits) + DeltaFind[Sym]]
+
+        Pad, payload = Writer.Flush(Acc, Count)
+        return state - self.TableSize, Pad, payload
+
+    def Decode(self, state: int, Pad: int, payload: bytes, length: int) -> bytes:
+        if not 0 <= state < self.TableSize:
+            raise ValueError(f"Initial tANS state {state} out of bounds")
+        DecodeTable = self.DecodeTable
+        Out = bytearray(length)
+        Reader = ReverseBitReader(payload, Pad)
+        Refill = Reader.Refill
+        Acc = Reader.Acc
+        Count = Reader.Count
+
+        for i in range(length):
+            Sym, nbBits, Baseline = DecodeTable[state]
+            Out[i] = Sym
+            if Count < nbBits:
+                Acc, Count = Refill(Acc, Count)
+            Count -= nbBits
+            state = Baseline + ((Acc >> Count) & ((1 << nbBits) - 1))
+
+        if not Reader.AtEnd(Count) or state != 0:
+            raise ValueError("tANS bit stream did not end in the initial state")
+        return bytes(Out)
+
+    def EncodeCodes(self, codes) -> Tuple[int, int, bytes]:
+        BucketOf, ExtraBits, Bases = BucketTables()
+        TableLog = self.TableLog
+        DeltaNbBits = self.DeltaNbBits
+        DeltaFind = self.DeltaFind
+        EncodeTable = self.EncodeTable
+        state = self.TableSize
+        Writer = ReverseBitWriter()
+        Spill = Writer.Spill
+        Acc = 0
+        Count = 0
+
+        for code in reversed(codes):
+            Sym = BucketOf[code]
+            Extra = ExtraBits[Sym]
+            Acc |= (code - Bases[Sym]) << Count
+            Count += Extra
+            nbBits = (state + DeltaNbBits[Sym]) >> TableLog
+            Acc |= (state & ((1 << nbBits) - 1)) << Count
+            Count += nbBits
+            if Count >= REVERSE_BLOCK_BITS:
+                Acc, Count = Spill(Acc, Count)
+            state = EncodeTable[(state >> nbBits) + DeltaFind[Sym]]
+
+        Pad, payload = Writer.Flush(Acc, Count)
+        return state - self.TableSize, Pad, payload
+
+    def DecodeCodes(self, state: int, Pad: int, payload: bytes, length: int) -> array:
+        if not 0 <= state < self.TableSize:
+            raise ValueError(f"Initial tANS state {state} out of bounds")
+        _, ExtraBits, Bases = BucketTables()
+        if max(self.Counts) >= len(Bases):
+            raise ValueError(f"tANS table holds bucket {max(self.Counts)}, but only {len(Bases)} buckets exist")
+        DecodeTable = self.DecodeTable
+        codes = array('H', bytes(2 * length))
+        Reader = ReverseBitReader(payload, Pad)
+        Refill = Reader.Refill
+        Acc = Reader.Acc
+        Count = Reader.Count
+
+        for i in range(length):
+            Sym, nbBits, Baseline = DecodeTable[state]
+            Extra = ExtraBits[Sym]
+            if Count < nbBits + Extra:
+                Acc, Count = Refill(Acc, Count)
+            Count -= nbBits
+            state = Baseline + ((Acc >> Count) & ((1 << nbBits) - 1))
+            Count -= Extra
+            codes[i] = Bases[Sym] + ((Acc >> Count) & ((1 << Extra) - 1))
+
+        if not Reader.AtEnd(Count) or state != 0:
+            raise ValueError("tANS bit stream did not end in the initial state")
+        return codes
+
+
+class TANSTableCache:
+    def __init__(self, max_size: int = TANS_TABLE_CACHE_SIZE):
+        self.MaxSize = max_size
+        self.Tables = OrderedDict()
+        self.Hits = 0
+        self.Misses = 0
+
+    def Lookup(self, Key, Build):
+        Table = self.Tables.get(Key)
+        if Table is not None:
+            self.Hits += 1
+            self.Tables.move_to_end(Key)
+            return Table
+        self.Misses += 1
+        Table = Build()
+        if self.MaxSize > 0:
+            self.Tables[Key] = Table
+            while len(self.Tables) > self.MaxSize:
+                self.Tables.popitem(last=False)
+        return Table
+
+    def Resize(self, max_size: int):
+        self.MaxSize = max_size
+        while len(self.Tables) > max(0, max_size):
+            self.Tables.popitem(last=False)
+
+    def Clear(self):
+        self.Tables.clear()
+        self.Hits = 0
+        self.Misses = 0
+
+    def Stats(self) -> Dict[str, int]:
+        return {'hits': self.Hits, 'misses': self.Misses, 'size': len(self.Tables), 'max_size': self.MaxSize}
+
+
+TANS_TABLE_CACHE = TANSTableCache()
+
+
+def SetTANSCacheSize(max_size: int):
+    TANS_TABLE_CACHE.Resize(max_size)
+
+
+def GetTANSCodec(FreqTable: Dict[int, int], TableLog: int = TANS_DEFAULT_TABLE_LOG, normalized: bool = False) -> TANSCodec:
+    ValTableLog(TableLog)
+    Counts = dict(FreqTable) if normalized else NormalizeFrequencies(FreqTable, 1 << TableLog)
+    Key = ('codec', TableLog, tuple(sorted(Counts.items())))
+    return TANS_TABLE_CACHE.Lookup(Key, lambda: TANSCodec(Counts, TableLog, normalized=True))
+
+
+def GetTANS(FreqTable: Dict[int, int], TableSize: int) -> TANS:
+    Counts = NormalizeFrequencies(FreqTable, TableSize)
+    Key = ('tans', TableSize, tuple(sorted(Counts.items())))
+    return TANS_TABLE_CACHE.Lookup(Key, lambda: TANS(Counts, TableSize=TableSize))
+
+
+def DecodeLane(Counts: Dict[int, int], TableLog: int, state: int, Pad: int, payload: bytes, length: int) -> bytes:
+    return GetTANSCodec(Counts, TableLog, normalized=True).Decode(state, Pad, payload, length)
+
+
+def EncodeLane(Counts: Dict[int, int], TableLog: int, data: bytes) -> Tuple[int, int, bytes]:
+    return GetTANSCodec(Counts, TableLog, normalized=True).Encode(data)
+
+
+def ContextFrequencies(data: bytes) -> Dict[int, Dict[int, int]]:
+    Contexts = {}
+    for (Context, Sym), Freq in Counter(zip(b'\x00' + data[:-1], data)).items():
+        Contexts.setdefault(Context, {})[Sym] = Freq
+    return Contexts
+
+
+def EncodeContexts(data: bytes, Codecs: List[TANSCodec]) -> Tuple[int, int, bytes]:
+    TableLog = Codecs[0].TableLog
+    DeltaNbBits = [0] * (256 * 256)
+    DeltaFind = [0] * (256 * 256)
+    EncodeTable = []
+    Offsets = {}
+    for Context, Codec in enumerate(Codecs):
+        if id(Codec) not in Offsets:
+            Offsets[id(Codec)] = len(EncodeTable)
+            EncodeTable += Codec.EncodeTable
+        Base = Context << 8
+        DeltaNbBits[Base:Base + len(Codec.DeltaNbBits)] = Codec.DeltaNbBits
+        DeltaFind[Base:Base + len(Codec.DeltaFind)] = [Find + Offsets[id(Codec)] for Find in Codec.DeltaFind]
+    state = 1 << TableLog
+    Writer = ReverseBitWriter()
+    Spill = Writer.Spill
+    Acc = 0
+    Count = 0
+
+    for Context, Sym in zip(reversed(b'\x00' + data[:-1]), reversed(data)):
+        Sym |= Context << 8
+        nbBits = (state + DeltaNbBits[Sym]) >> TableLog
+        Acc |= (state & ((1 << nbBits) - 1)) << Count
+        Count += nbBits
+        if Count >= REVERSE_BLOCK_BITS:
+            Acc, Count = Spill(Acc, Count)
+        state = EncodeTable[(state >> nbBits) + DeltaFind[Sym]]
+
+    Pad, payload = Writer.Flush(Acc, Count)
+    return state - (1 << TableLog), Pad, payload
+
+
+def DecodeContexts(Codecs: List[TANSCodec], state: int, Pad: int, payload: bytes, length: int) -> bytes:
+    if not 0 <= state < Codecs[0].TableSize:
+        raise ValueError(f"Initial tANS state {state} out of bounds")
+    Tables = [Codec.DecodeTable for Codec in Codecs]
+    Out = bytearray(length)
+    Reader = ReverseBitReader(payload, Pad)
+    Refill = Reader.Refill
+    Acc = Reader.Acc
+    Count = Reader.Count
+    Sym = 0
+
+    for i in range(length):
+        Sym, nbBits, Baseline = Tables[Sym][state]
+        Out[i] = Sym
+        if Count < nbBits:
+            Acc, Count = Refill(Acc, Count)
+        Count -= nbBits
+        state = Baseline + ((Acc >> Count) & ((1 << nbBits) - 1))
+
+    if not Reader.AtEnd(Count) or state != 0:
+        raise ValueError("tANS bit stream did not end in the initial state")
+    return bytes(Out)